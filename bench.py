@@ -0,0 +1,379 @@
+#!/usr/bin/env python2
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+# bench.py - time parse, convert and format over tests/*.pch and
+#            generated synthetic patches.
+#
+#   bench.py -o before.json          # record
+#   bench.py -c before.json          # compare a later run with it
+#
+
+import json, logging, os, random, re, resource, shutil, sys, tempfile, time
+from glob import glob
+from multiprocessing import Pool
+from optparse import OptionParser, make_option
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from nord import printf
+
+g2oolsdir = os.path.dirname(os.path.abspath(__file__))
+
+bench_options = [
+  make_option('-b', '--bench', action='append',
+      dest='benches', default=[],
+      help='Only run BENCH (may be repeated, default all)'),
+  make_option('-c', '--compare', action='store',
+      dest='compare', default=None,
+      help='Compare the results with a saved JSON file'),
+  make_option('-n', '--repeat', action='store', type='int',
+      dest='repeat', default=5,
+      help='Best of REPEAT runs (default 5)'),
+  make_option('-o', '--output', action='store',
+      dest='output', default=None,
+      help='Save the results as JSON to OUTPUT'),
+  make_option('-s', '--synthetic', action='store', type='int',
+      dest='synthetic', default=6,
+      help='Copies of the voice area in synthetic .pch files (default 6)'),
+]
+
+#
+# synthetic input generation
+#
+tiled_sections = {
+  # section: fields holding module indexes
+  'ModuleDump': [0], 'CableDump': [1, 4], 'ParameterDump': [0],
+  'CustomDump': [0], 'NameDump': [0],
+}
+
+def tile_pch(src, dst, copies):
+  '''tile_pch(src, dst, copies) - write dst with the voice area of src
+  repeated copies times, each below the previous one.'''
+  data = open(src).read().replace('\r', '')
+  sections = re.findall(r'\[(\w+)\]\n(.*?)\[/\1\]\n', data, re.S)
+  modules = [ map(int, line.split()) for title, body in sections
+      if title == 'ModuleDump' and body.split('\n')[0].strip() == '1'
+      for line in body.split('\n')[1:] if line.strip() ]
+  nindexes = max([ m[0] for m in modules ])
+  nrows = max([ m[3] for m in modules ]) + 8
+
+  out = []
+  for title, body in sections:
+    lines = [ line.strip() for line in body.split('\n') if line.strip() ]
+    if title in tiled_sections and lines and lines[0] == '1':
+      fields = tiled_sections[title]
+      tiled = []
+      for copy in range(copies):
+        count = 0 # ParameterDump values still to come from the next line
+        for line in lines[1:]:
+          if title == 'NameDump': # names may contain spaces
+            values = line.split(' ', 1)
+          else:
+            values = line.split()
+          if count > 0:
+            count -= len(line.split())
+            tiled.append(line)
+            continue
+          for field in fields:
+            values[field] = str(int(values[field]) + copy * nindexes)
+          if title == 'ModuleDump':
+            values[3] = str(int(values[3]) + copy * nrows)
+          if title == 'ParameterDump':
+            count = int(line.split()[2]) - len(line.split()[3:])
+          tiled.append(' '.join(values))
+      lines = lines[:1] + tiled
+    out.append('[%s]\r\n%s\r\n[/%s]\r\n' % (title, '\r\n'.join(lines), title))
+  open(dst, 'w').write(''.join(out))
+
+def make_syx(dst, seed=1):
+  '''make_syx(dst, seed) - write a random 32 voice dx7 bank.'''
+  rand = random.Random(seed)
+  r = rand.randint
+  voices = []
+  for voice in range(32):
+    for op in range(6):
+      voices.extend([ r(0, 99) for i in range(11) ]) # rates, levels, scaling
+      voices.extend([ r(0, 15), r(0, 14)<<3|r(0, 7), r(0, 7)<<2|r(0, 3),
+          r(0, 99), r(0, 31)<<1|r(0, 1), r(0, 99) ])
+    voices.extend([ r(0, 99) for i in range(8) ]) # pitch eg
+    voices.extend([ r(0, 31), r(0, 1)<<3|r(0, 7) ])
+    voices.extend([ r(0, 99) for i in range(4) ]) # lfo
+    voices.extend([ r(0, 7)<<4|r(0, 5)<<1|r(0, 1), r(0, 48) ])
+    voices.extend([ ord(rand.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ '))
+        for i in range(10) ])
+  bank = bytearray('\xf0\x43\x00\x09\x20\x00') + bytearray(voices)
+  bank += bytearray([(-sum(voices)) & 0x7f, 0xf7])
+  open(dst, 'wb').write(bank)
+
+def make_prf2(dst, pch2s):
+  '''make_prf2(dst, pch2s) - write a performance of the 4 pch2s.'''
+  from nord.g2.file import Pch2File, Prf2File, PerformanceDescription
+  from nord.g2.file import Description
+  from nord.file import Knob
+  prf2 = Prf2File()
+  performance = prf2.performance
+  description = performance.description = Description()
+  for name, nbits in PerformanceDescription.description_attrs:
+    setattr(description, name, 0)
+  description.bpm = 120
+  for slot, pch2 in zip(performance.slots, pch2s):
+    # a fresh parse per slot, so no copy is needed (or copy_patch, which
+    # older trees do not have)
+    slot.patch = Pch2File(pch2).patch
+    slot.name = os.path.basename(pch2)[:16]
+    slot.description = Description()
+    for name, nbits in PerformanceDescription.slot_attrs:
+      setattr(slot.description, name, 0)
+    slot.description.active = 1
+    slot.description.keyhigh = 127
+  performance.knobs = [ Knob() for i in range(120) ]
+  for knob in performance.knobs:
+    knob.assigned = 0
+  prf2.write(dst)
+
+#
+# benchmarks, each run in a fresh process so peak memory is its own.
+# bench_*(files) does the untimed setup and returns the function that
+# is timed.  it returns the number of operations it did and a dict of
+# stage times or None.  a bench of something the tree does not have
+# returns None instead of a function.
+#
+def nm2g2_options():
+  from nm2g2 import nm2g2_options
+  options, args = OptionParser(option_list=nm2g2_options).parse_args([])
+  options.programpath = os.path.join(g2oolsdir, 'nm2g2.py')
+  options.log = logging.getLogger('bench')
+  options.log.setLevel(logging.CRITICAL)
+  return options
+
+def bench_pch_parse(files):
+  from nord.nm1.file import PchFile
+  def run():
+    for pch in files['pch']:
+      PchFile(pch)
+    return len(files['pch']), None
+  return run
+
+# converter steps in the order NM2G2Converter.convert() calls them
+convert_stages = [
+  'doconverters', 'domodules', 'docolorizemultis', 'dogroups',
+  'doreposition', 'doprecables', 'docables', 'dologiccombine',
+  'docableshorten', 'douprate', 'cablerecolorize',
+  'domorphs', 'doknobs', 'domidiccs', 'docurrentnotes', 'dofinalize',
+  'dotitleblock',
+]
+
+def timed(func, name, stages):
+  def stage(*a, **kw):
+    t = time.time()
+    try:
+      return func(*a, **kw)
+    finally:
+      stages[name] = stages.get(name, 0.0) + time.time() - t
+  return stage
+
+def bench_convert(files):
+  from nord.nm2g2 import NM2G2Converter
+  options = nm2g2_options()
+  def run():
+    stages = {}
+    for pch in files['pch']:
+      t = time.time()
+      nm2g2 = NM2G2Converter(pch, options, options.log)
+      stages['init'] = stages.get('init', 0.0) + time.time() - t
+      for name in convert_stages:
+        setattr(nm2g2, name, timed(getattr(nm2g2, name), name, stages))
+      nm2g2.pch2.write = timed(nm2g2.pch2.write, 'write', stages)
+      nm2g2.convert()
+    return len(files['pch']), stages
+  return run
+
+def bench_pch2_read(files):
+  from nord.g2.file import Pch2File
+  def run():
+    for pch2 in files['pch2']:
+      Pch2File(pch2)
+    return len(files['pch2']), None
+  return run
+
+def bench_pch2_load(files):
+  from nord.g2.file import Pch2File
+  def run():
+    # keep every patch like a library loaded for analysis, the peak
+    # memory of this bench is what the patches cost.
+    library = [ Pch2File(pch2) for i in range(10) for pch2 in files['pch2'] ]
+    return len(library), None
+  return run
+
+def bench_pch2_format(files):
+  from nord.g2.file import Pch2File
+  pch2s = [ Pch2File(pch2) for pch2 in files['pch2'] ]
+  def run():
+    for pch2 in pch2s:
+      pch2.format_file()
+    return len(pch2s), None
+  return run
+
+def bench_area_graph(files):
+  from nord.file import Area
+  from nord.g2.file import Pch2File
+  if not hasattr(Area, 'graph'):
+    return None
+  patches = [ Pch2File(pch2).patch for pch2 in files['pch2'] ]
+  areas = [ area for patch in patches for area in [patch.voice, patch.fx] ]
+  def run():
+    for area in areas:
+      area.graph().components()
+    return len(areas), None
+  return run
+
+def bench_prf2_read(files):
+  from nord.g2.file import Prf2File
+  if not files['prf2']:
+    return None
+  def run():
+    for prf2 in files['prf2']:
+      Prf2File(prf2)
+    return len(files['prf2']), None
+  return run
+
+def bench_dx2g2(files):
+  import dx2g2
+  options, args = OptionParser(option_list=dx2g2.dx2g2_options).parse_args([])
+  logging.getLogger('').setLevel(logging.CRITICAL)
+  def run():
+    for syx in files['syx']:
+      dx2g2.convert(syx, options)
+    return len(files['syx']), None
+  return run
+
+benches = [
+  ['pch.parse', bench_pch_parse],
+  ['nm2g2.convert', bench_convert],
+  ['pch2.read', bench_pch2_read],
+  ['pch2.load', bench_pch2_load],
+  ['pch2.format', bench_pch2_format],
+  ['area.graph', bench_area_graph],
+  ['prf2.read', bench_prf2_read],
+  ['dx2g2.convert', bench_dx2g2],
+]
+
+def run_bench(job):
+  name, files, repeat = job
+  run = dict(benches)[name](files)
+  if not run:
+    return None
+  best, stages = None, None
+  for i in range(repeat):
+    t = time.time()
+    ops, s = run()
+    t = time.time() - t
+    if best == None or t < best:
+      best, stages = t, s
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return { 'ops': ops, 'seconds': best, 'ops_per_sec': ops / best,
+      'peak_kb': peak, 'stages': stages }
+
+def make_files(dir, copies):
+  files = { 'dir': dir }
+  pchdir = os.path.join(dir, 'pch')
+  os.mkdir(pchdir)
+  pchs = sorted(glob(os.path.join(g2oolsdir, 'tests', '*.pch')))
+  for pch in pchs:
+    shutil.copy(pch, pchdir)
+  # these still fit in a g2 area (127 modules) after 6 copies
+  for name in ['testenv', 'testlogic', 'testmixer', 'testseq']:
+    tile_pch(os.path.join(g2oolsdir, 'tests', name + '.pch'),
+        os.path.join(pchdir, 'synth-%s-%d.pch' % (name, copies)), copies)
+  files['pch'] = sorted(glob(os.path.join(pchdir, '*.pch')))
+
+  # pch2s are the converted pchs (and dx7 bank) outputs.
+  run_bench(('nm2g2.convert', files, 1))
+  files['syx'] = [ os.path.join(dir, 'bank.syx') ]
+  make_syx(files['syx'][0])
+  run_bench(('dx2g2.convert', files, 1))
+  files['pch2'] = sorted(glob(os.path.join(pchdir, '*.pch2')) +
+      glob(os.path.join(dir, '*.pch2')))
+  synth = [ pch2 for pch2 in files['pch2'] if 'synth-' in pch2 ]
+  files['prf2'] = [ os.path.join(dir, 'perf.prf2') ]
+  try:
+    make_prf2(files['prf2'][0], (synth + files['pch2'])[:4])
+  except Exception, e: # the baseline can not write performances
+    printf('no .prf2 input: %s\n', e)
+    files['prf2'] = []
+  return files
+
+def in_worker(func, *args):
+  '''in_worker(func, args...) -> func(args...) run in a fresh process.
+
+  the parent never imports the converters or parses a patch, so nothing
+  it caches is inherited by the benches (or counted in their peak).
+  the worker runs in the g2ools directory, as the converters still open
+  some of their templates (dx7.pch2) relative to it.
+'''
+  pool = Pool(1, os.chdir, (g2oolsdir,))
+  try:
+    return pool.apply(func, args)
+  finally:
+    pool.close()
+    pool.join()
+
+def compare(results, old):
+  printf('%-16s %12s %12s %8s %10s %10s\n', 'bench', 'old ops/s',
+      'new ops/s', 'ratio', 'old MB', 'new MB')
+  for name, result in sorted(results.items()):
+    if name in old:
+      o, n = old[name]['ops_per_sec'], result['ops_per_sec']
+      printf('%-16s %12.2f %12.2f %7.2fx %10.1f %10.1f\n', name, o, n, n / o,
+          old[name]['peak_kb'] / 1024., result['peak_kb'] / 1024.)
+
+def main(argv):
+  parser = OptionParser('usage: %prog [options]', option_list=bench_options)
+  (options, args) = parser.parse_args(argv[1:])
+  names = options.benches or [ name for name, func in benches ]
+
+  dir = tempfile.mkdtemp(prefix='g2bench')
+  try:
+    files = in_worker(make_files, dir, options.synthetic)
+    results = {}
+    printf('%-16s %6s %10s %12s %10s\n',
+        'bench', 'ops', 'seconds', 'ops/sec', 'peak MB')
+    for name in names:
+      result = in_worker(run_bench, (name, files, options.repeat))
+      if not result:
+        printf('%-16s %6s\n', name, 'n/a')
+        continue
+      results[name] = result
+      printf('%-16s %6d %10.4f %12.2f %10.1f\n', name, result['ops'],
+          result['seconds'], result['ops_per_sec'], result['peak_kb'] / 1024.)
+      for stage, seconds in sorted((result['stages'] or {}).items(),
+          key=lambda s: -s[1]):
+        printf('  %-20s %10.4f\n', stage, seconds)
+  finally:
+    shutil.rmtree(dir)
+
+  if options.output:
+    out = open(options.output, 'w')
+    json.dump({ 'python': sys.version.split()[0], 'results': results }, out,
+        indent=1, sort_keys=True)
+    out.close()
+  if options.compare:
+    compare(results, json.load(open(options.compare))['results'])
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -22,7 +22,7 @@ unavailable = [
 
 for arg in sys.argv[1:]:
   try:
-    pch2 = Pch2File(arg)
+    pch2 = Pch2File(arg, lazy=True)
     p = pch2.patch
     demo = True
     for module in p.voice.modules + p.fx.modules:
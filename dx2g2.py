@@ -6,14 +6,15 @@ from optparse import OptionParser, make_option
 from array import array
 sys.path.append('.')
 from nord import units
-from nord.g2.file import Pch2File, crc
+from nord.g2.file import pch2_template
+from nord.g2.crc import crc
 from nord.g2.colors import g2modulecolors
 from nord.convert.version import version as g2oolsversion
 from nord.convert.dx7 import dxtable
 
 class DX7Converter: 
   def __init__(self):
-    self.pch2 = Pch2File('dx7.pch2')
+    self.pch2 = pch2_template('dx7.pch2')
     self.dxrouter = self.module_by_name('DXRouter1')
     self.operators = [self.module_by_name('Operator%d'%i) for i in range(1, 7)]
     self.lfo = self.module_by_name('LFO')
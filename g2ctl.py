@@ -7,6 +7,7 @@ from nord import printf
 from nord.g2.categories import g2categories
 from nord.g2.file import Pch2File
 from nord.g2.bits import BitStream
+from nord.g2.crc import crc
 from array import array
 
 # vim: set sw=2:
@@ -289,20 +290,6 @@ def hexdump(bytes, addr=0, size=1):
       ''.join([out(byte) for byte in bytes[off:off+16]])))
   return '\n'.join(s)
 
-def crc16(val, icrc):
-  k = (((icrc>>8)^val)&0xff)<<8
-  crc = 0
-  for bits in range(8):
-    if (crc^k)&0x8000 != 0:
-      crc = (crc<<1)^0x1021
-    else:
-      crc <<= 1
-    k <<= 1
-  return (icrc<<8)^crc
-
-def crc(s):
-  return reduce(lambda a, b: crc16(b, a), s, 0) & 0xffff
-
 CMD_A    = 0x08
 CMD_B    = 0x09
 CMD_C    = 0x0a
@@ -367,7 +354,7 @@ class G2USBInterface:
     # handle 0x80 (init) messages specially
     if data[0] == CMD_INIT:
       # message 0x80 is just itself
-      s = data
+      s = bytearray(data)
     else:
       # messages start with 0x01 0xRC 0xDD 0xDD .. 0xDD
       # C: command (usually just the lower nibble)
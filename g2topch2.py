@@ -376,24 +376,23 @@ class G2Patch(G2Section):
     self.actions['setting']  = self.setting
 
   def update_inputs(self, net, uprate):
-    # loop through all net inputs
-    # get proper color based on rate
-    # update all cables connected to each input
-    for input in net.inputs:
-      if not net.output:
-        continue
+    # get proper color based on rate of the net output
+    # update all white cables connected to each input
+    if not net.output:
+      return
 
-      color = g2cablecolors.white
-      rate = net.output.rate
-      if rate == g2conncolors.blue_red:
-        color = [g2cablecolors.blue, g2cablecolors.red][uprate]
-      elif rate == g2conncolors.red:
-        color = g2cablecolors.red
-      elif rate == g2conncolors.blue:
-        color = g2cablecolors.blue
-      elif rate == g2conncolors.yellow_orange:
-        color = [g2cablecolors.yellow, g2cablecolors.orange][uprate]
+    color = g2cablecolors.white
+    rate = net.output.rate
+    if rate == g2conncolors.blue_red:
+      color = [g2cablecolors.blue, g2cablecolors.red][uprate]
+    elif rate == g2conncolors.red:
+      color = g2cablecolors.red
+    elif rate == g2conncolors.blue:
+      color = g2cablecolors.blue
+    elif rate == g2conncolors.yellow_orange:
+      color = [g2cablecolors.yellow, g2cablecolors.orange][uprate]
 
+    for input in net.inputs:
       for cable in input.cables:
         if cable.color == g2cablecolors.white:
           cable.color = color
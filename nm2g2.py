@@ -20,11 +20,15 @@
 #
 
 import logging
-import os, sys, time, traceback
+import copy, os, sys, time, traceback
 from optparse import OptionParser, make_option
 from glob import glob
+from multiprocessing import Pool
+from StringIO import StringIO
 sys.path.append('.')
 from nord.nm2g2 import NM2G2Converter, NM1Error
+from nord.convert.cache import ConvertCache, sources
+from nord.nm1.cache import PatchCache
 
 #__builtins__.printf = printf
 
@@ -38,9 +42,15 @@ nm2g2_options = [
   make_option('-c', '--compress-columns', action='store_true',
       dest='compresscolumns', default=False,
       help='Remove columns not containing modules'),
+  make_option('-C', '--cache', action='store',
+      dest='cache', default=None,
+      help='Skip patches CACHE says are unchanged since converted'),
   make_option('-d', '--debug', action='store_true',
       dest='debug', default=False,
       help='Allow exceptions to terminate application'),
+  make_option('-j', '--jobs', action='store', type='int',
+      dest='jobs', default=1,
+      help='Convert JOBS files in parallel (default 1)'),
   make_option('-k', '--keep-old', action='store_true',
       dest='keepold', default=False,
       help='If .pch2 file exists, do not replace it'),
@@ -56,6 +66,9 @@ nm2g2_options = [
   make_option('-p', '--pad-mixer', action='store_true',
       dest='padmixer', default=False,
       help='Use mixers with Pad when possible'),
+  make_option('-P', '--pch-cache', action='store',
+      dest='pchcache', default=None,
+      help='Keep parsed .pch files in PCHCACHE directory'),
   make_option('-r', '--recursive', action='store_true',
       dest='recursive', default=False,
       help='On dir arguments, convert all .pch files'),
@@ -72,6 +85,9 @@ def doconvert(filename, options):
   try:
     nm2g2 = NM2G2Converter(filename, options, options.log)
     nm2g2.convert()
+    if options.cache:
+      options.converted.append((filename,
+          sources(nm2g2.voiceconverters + nm2g2.fxconverters)))
   except KeyboardInterrupt:
     sys.exit(1)
   except NM1Error, s:
@@ -92,19 +108,33 @@ def process_file(filename, options):
       testname = filename+'.pch'
     if options.keepold and os.path.exists(testname + '2'):
       return
+    if options.cache and options.cache.fresh(filename, options):
+      return
     options.log.error('"%s"' % filename)
     failed = doconvert(filename, options)
     if failed:
       options.failedpatches.append(failed)
     options.log.info('-' * 20)
 
-def main(argv, stream):
-  global nm2g2_options
+def find_files(args, options):
+  '''find_files(args, options) -> generator of (filename, found) to process.
+  found is False for args that do not match any file.
+  '''
+  while len(args):
+    arg = args.pop(0)
+    pathlist = glob(arg)
+    if len(pathlist) == 0:
+      yield arg, False
+      continue
+    for path in pathlist:
+      if os.path.isdir(path) and options.recursive:
+        for root, dirnamess, filenames in os.walk(path):
+          for name in filenames:
+            yield os.path.join(root, name), True
+      else:
+        yield path, True
 
-  parser = OptionParser("usage: %prog [options] <pch-files-or-dirs>",
-      option_list=nm2g2_options)
-  (options, args) = parser.parse_args(argv[:])
-  options.programpath = args.pop(0)
+def setup_log(options, stream):
   verbosity = [
     logging.CRITICAL,
     logging.ERROR,
@@ -114,7 +144,8 @@ def main(argv, stream):
   ][int(options.verbosity)]
 
   options.log = logging.getLogger('nm2g2')
-  options.failedpatches = []
+  for hdlr in options.log.handlers[:]:
+    options.log.removeHandler(hdlr)
 
   fmt = logging.Formatter('%(message)s', None)
   hdlr = logging.StreamHandler(stream)
@@ -123,20 +154,79 @@ def main(argv, stream):
   options.log.setLevel(verbosity)
   options.log.propagate = False
 
-  while len(args):
-    arg = args.pop(0)
-    pathlist = glob(arg)
-    if len(pathlist) == 0:
-      options.failedpatches.append(arg)
-      continue
-    for path in pathlist:
-      if os.path.isdir(path) and options.recursive:
-        for root, dirnamess, filenames in os.walk(path):
-          for name in filenames:
-            filename = os.path.join(root, name)
-            process_file(filename, options)
+# per process state of --jobs workers (see init_job())
+job_options = None
+job_stream = None
+
+def init_job(options):
+  global job_options, job_stream
+  job_options = options
+  job_stream = StringIO()
+  setup_log(job_options, job_stream)
+
+def process_file_job(job):
+  '''process_file_job((filename, found)) -> (log output, failed, converted)
+  run process_file() within a --jobs worker and return what it logged,
+  which patches failed and which converted so the parent can merge them
+  in order.
+  '''
+  filename, found = job
+  if not found:
+    return '', [filename], []
+  job_stream.seek(0)
+  job_stream.truncate()
+  job_options.failedpatches = []
+  job_options.converted = []
+  process_file(filename, job_options)
+  return job_stream.getvalue(), job_options.failedpatches, \
+      job_options.converted
+
+def process_files(jobs, options, stream):
+  # log objects can't be passed to the workers, they set up their own.
+  jobopts = copy.copy(options)
+  jobopts.log = None
+  pool = Pool(options.jobs, init_job, (jobopts,))
+  try:
+    for log, failed, converted in pool.imap(process_file_job, jobs):
+      if log:
+        stream.write(log)
+        stream.flush()
+      options.failedpatches.extend(failed)
+      options.converted.extend(converted)
+    pool.close()
+  except KeyboardInterrupt:
+    pool.terminate()
+    sys.exit(1)
+  pool.join()
+
+def main(argv, stream):
+  global nm2g2_options
+
+  parser = OptionParser("usage: %prog [options] <pch-files-or-dirs>",
+      option_list=nm2g2_options)
+  (options, args) = parser.parse_args(argv[:])
+  options.programpath = args.pop(0)
+  options.failedpatches = []
+  options.converted = []
+  if options.cache:
+    options.cache = ConvertCache(options.cache)
+  if options.pchcache:
+    options.pchcache = PatchCache(options.pchcache)
+  setup_log(options, stream)
+
+  if options.jobs > 1:
+    process_files(find_files(args, options), options, stream)
+  else:
+    for filename, found in find_files(args, options):
+      if found:
+        process_file(filename, options)
       else:
-        process_file(path, options)
+        options.failedpatches.append(filename)
+
+  if options.cache:
+    for filename, used in options.converted:
+      options.cache.add(filename, options, used)
+    options.cache.save()
 
   if len(options.failedpatches):
     s = 'Failed patches: \n %s\n' % '\n '.join(options.failedpatches)
@@ -0,0 +1,121 @@
+#
+# cache.py - conversion cache for nm2g2
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import hashlib, json, os, sys
+from nord.convert.version import version as g2oolsversion
+
+# options that change the generated .pch2
+option_flags = [
+  'adsrforad', 'compresscolumns', 'g2overdrive',
+  'logiccombine', 'padmixer', 'shorten',
+]
+
+# modules every conversion runs through.  the nord.convert modules
+# holding the module converters are added per patch (see sources()).
+core_modules = [
+  'nord.nm2g2', 'nord.convert', 'nord.convert.convert',
+  'nord.convert.table', 'nord.utils', 'nord.units', 'nord.file',
+  'nord.module', 'nord.net', 'nord.nm1.file', 'nord.nm1.modules',
+  'nord.g2.file', 'nord.g2.misc', 'nord.g2.modules', 'nord.g2.params',
+  'nord.g2.colors', 'nord.g2.bits', 'nord.g2.crc', 'nord.graph',
+]
+
+# the compiled bit stream replaces the nord.g2.bits one when it is built
+compiled_modules = [ 'nord.g2._bits' ]
+
+source_hashes = {}
+def source_hash(name):
+  '''source_hash(name) -> sha1 of the source (or library) of module name.'''
+  if not name in source_hashes:
+    filename = sys.modules[name].__file__
+    if filename[-4:] in ['.pyc', '.pyo']:
+      filename = filename[:-1]
+    source_hashes[name] = hashlib.sha1(open(filename, 'rb').read()).hexdigest()
+  return source_hashes[name]
+
+def file_hash(filename):
+  return hashlib.sha1(open(filename, 'rb').read()).hexdigest()
+
+def sources(converters):
+  '''sources(converters) -> sorted names of the modules converters
+  (and their base classes) come from.'''
+  names = set()
+  for conv in converters:
+    for cls in type(conv).__mro__:
+      if cls.__module__.startswith('nord.convert'):
+        names.add(cls.__module__)
+  return sorted(names)
+
+class ConvertCache(object):
+  '''ConvertCache(filename) - remember what each .pch was converted from.
+
+  an entry is keyed by the .pch content, g2ools version, the options
+  in option_flags and the sources of the core modules and of the
+  converter modules the patch used.  a converter change therefore only
+  invalidates the patches that contain the modules it converts.
+'''
+  def __init__(self, filename):
+    self.filename = filename
+    self.entries = {}
+    if os.path.exists(filename):
+      self.entries = json.load(open(filename))
+
+  def save(self):
+    out = open(self.filename, 'w')
+    json.dump(self.entries, out, indent=1, sort_keys=True)
+    out.close()
+
+  def key(self, filename, options, used):
+    sha1 = hashlib.sha1(file_hash(filename))
+    sha1.update(g2oolsversion)
+    for flag in option_flags:
+      sha1.update('%s=%s' % (flag, getattr(options, flag)))
+    initpatch = os.path.join(os.path.dirname(options.programpath),
+        'initpatch.pch2')
+    sha1.update(file_hash(initpatch))
+    names = core_modules + used
+    if getattr(options, 'pchcache', None):
+      names = names + [ 'nord.nm1.cache' ]
+    for name in names:
+      if not name in sys.modules:
+        __import__(name)
+      sha1.update(source_hash(name))
+    for name in compiled_modules:
+      try:
+        __import__(name)
+      except ImportError:
+        continue
+      sha1.update(source_hash(name))
+    return sha1.hexdigest()
+
+  def fresh(self, filename, options):
+    '''fresh(filename, options) -> True if filename+'2' is up to date.'''
+    entry = self.entries.get(os.path.abspath(filename))
+    if not entry or not os.path.exists(filename + '2'):
+      return False
+    return entry['key'] == self.key(filename, options, entry['used'])
+
+  def add(self, filename, options, used):
+    '''add(filename, options, used) - record a successful conversion.'''
+    self.entries[os.path.abspath(filename)] = {
+      'key': self.key(filename, options, used), 'used': used,
+    }
@@ -263,12 +263,21 @@ def handleoscmasterslv(conv, mst, left, bp, right, lev1, lev2, sub48=False):
 
   return greyout.outputs.Out
 
+def removeconnectors(area, connectors):
+  '''removeconnectors(area, connectors) -> None
+  remove connectors from their nets with one area Rewire commit.
+  '''
+  rewire = area.rewire()
+  for connector in connectors:
+    area.removeconnector(connector, rewire)
+  rewire.commit()
+
 def doslvcables(conv):
   '''doslvcables(conv) -> None
   '''
   if not hasattr(conv, 'slvoutput'):
     return
+  removeconnectors(conv.nmmodule.area, conv.slaves)
   for input in conv.slaves:
-    conv.nmmodule.area.removeconnector(input)
     conv.connect(conv.slvoutput, input.module.conv.inputs[input.index])
 
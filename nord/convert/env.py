@@ -23,7 +23,7 @@ from nord import printf
 from nord.utils import setv, getv
 from nord.units import nm1adsrtime, g2adsrtime, adsrtime_map
 from nord.convert import Convert
-from nord.convert.convert import updatevals
+from nord.convert.convert import updatevals, removeconnectors
 
 def handleretrig(conv):
   gatein, retrig = conv.g2module.inputs.Gate, None
@@ -46,7 +46,7 @@ def handlegate(conv, name='Gate'):
   if not gate or not gate.net or not gate.net.output:
     return
   if gate.net.output.module.type.shortnm == 'Keyboard':
-    conv.nmmodule.area.removeconnector(gate)
+    removeconnectors(conv.nmmodule.area, [gate])
     setv(conv.g2module.params.KB, 1)
 
 class ConvADSR_Env(Convert):
@@ -19,8 +19,10 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 #
 #from nord import printf
+from heapq import heappop, heappush
 from nord.net import NetList
-from nord.module import Module
+from nord.graph import AreaGraph
+from nord.module import Module, prototype
 
 from array import array
 def hexdump(data, addr=0, size=1):
@@ -68,29 +70,96 @@ def binhexdump(data, addr=0, bits=None):
   # 0[3[f ][1f   ]
   return '\n'.join(s)
 
+# the patch records below use __slots__, a library of patches holds
+# a lot of them.  members are only set when known (hasattr() works).
 class Note(object):
   '''Note class for nord patch notes.'''
-  pass
+  __slots__ = ( 'note', 'attack', 'release' )
 
 class Cable(object):
   '''Cable class for patch cables.'''
+  __slots__ = ( 'area', 'color', 'source', 'dest' )
   def __init__(self, area):
     self.area = area
 
 class MorphMap(object):
   '''MorphMap class for patch morph parameters.'''
-  pass
+  __slots__ = ( 'param', 'morph', 'range', 'variation' )
 
 class Knob(object):
   '''Knob class for patch knob settings.'''
-  pass
+  __slots__ = ( 'param', 'assigned', 'isled', 'slot', 'knob' )
 
 class Ctrl(object):
   '''Ctrl class for patch midi assignments.'''
-  pass
+  __slots__ = ( 'param', 'midicc', 'type' )
+
+def connector_coords(conn):
+  '''connector_coords(conn) -> (x, y) coordinates of connector conn'''
+  return conn.module.connector_coords()[conn.direction][conn.index]
 
 MAX_MODULES = 127
 
+class Rewire(object):
+  '''Rewire(area) - a batch of cable disconnects and connects.
+
+\tthe connector cables change at once, so a batch sees its own edits, but
+the netlist is left alone until commit(), which rebuilds each net the
+disconnected cables were on once and adds the new cables, so editing a
+net costs one rebuild rather than one per cable.  area.cables keeps the
+disconnected cables until commit().
+'''
+  def __init__(self, area):
+    self.area = area
+    self.removed = set()
+    self.added = []
+    self.nets = set()
+
+  def disconnect(self, cable):
+    '''disconnect(cable) -> None'''
+    cable.source.cables.remove(cable)
+    cable.dest.cables.remove(cable)
+    self.removed.add(cable)
+    # None for a cable connected in this batch onto no net
+    if cable.source.net:
+      self.nets.add(cable.source.net)
+
+  def connect(self, source, dest, color):
+    '''connect(source, dest, color) -> cable'''
+    cable = self.area.add_cable(source, dest, color)
+    self.added.append(cable)
+    return cable
+
+  def commit(self):
+    '''commit() -> None
+
+\tapply the disconnects and connects to area.cables and the netlist.
+'''
+    area, netlist = self.area, self.area.netlist
+    removed = self.removed
+    if removed:
+      area.cables = [ cable for cable in area.cables if not cable in removed ]
+
+    # take the nets apart and rebuild them from the cables left, in
+    # area.cables order, then add the new cables (last in area.cables).
+    if self.nets:
+      conns = set()
+      for net in self.nets:
+        conns.update(net.inputs)
+        if net.output:
+          conns.add(net.output)
+        netlist.remove(net)
+      added = set(self.added)
+      for cable in area.cables:
+        if (cable.source in conns or cable.dest in conns) and \
+            not cable in added:
+          netlist.add(cable.source, cable.dest)
+
+    for cable in self.added:
+      if not cable in removed:
+        netlist.add(cable.source, cable.dest)
+    self.removed, self.added, self.nets = set(), [], set()
+
 class Area(object):
   '''Area class for patch voice and fx area data (modules, cables, etc...)
 
@@ -108,16 +177,26 @@ for the voice and fx areas of a nord modules g2 patch.
     self.index = index
     self.name = name
     self.modules = []
+    self.modules_by_index = {}
     self.cables = []
     self.netlist = NetList()
-    self.free_indexes = range(1, MAX_MODULES+1)
+    self.free_indexes = range(1, MAX_MODULES+1) # heap
+
+  def index_modules(self):
+    '''index_modules() -> None
+
+\trebuild the module index and free indexes from modules.
+\tcalled by parsers that fill modules directly.
+'''
+    # first module wins if a (broken) file repeats an index
+    self.modules_by_index = dict([ (m.index, m)
+        for m in reversed(self.modules) ])
+    self.free_indexes = [ index for index in range(1, MAX_MODULES+1)
+        if not index in self.modules_by_index ]
 
   def find_module(self, index):
     '''find_module(index) -> module at index or None'''
-    for module in self.modules:
-      if module.index == index:
-        return module
-    return None
+    return self.modules_by_index.get(index)
 
   modmembers = [ 'name', 'index', 'color', 'horiz', 'vert', 'uprate', 'leds' ]
 
@@ -130,20 +209,34 @@ for the voice and fx areas of a nord modules g2 patch.
 \tcolor\tcolor of module (nord.g2.color.g2modulecolors.
 \thoriz\tcolumn where module is placed (<32).
 \tvert\trow where module is placed (<127)
+\tindex\tmodule index, 1-MAX_MODULES and not used (default lowest free).
 '''
     if len(self.modules) >= MAX_MODULES:
       raise Exception('Too many modules')
 
+    index = kw.pop('index', None)
+    if index != None:
+      if index < 1 or index > MAX_MODULES:
+        raise Exception('Module index %d not in 1-%d' % (index, MAX_MODULES))
+      if index in self.modules_by_index:
+        raise Exception('Module index %d already used' % index)
+
     type = self.fromname(shortnm)
     m = Module(type, self)
     m.name = type.shortnm
-    if len(self.free_indexes) == 0:
+    # free_indexes may still hold indexes taken by an explicit index
+    while index == None and len(self.free_indexes):
+      index = heappop(self.free_indexes)
+      if index in self.modules_by_index:
+        index = None
+    if index == None:
       raise Exception('No free module indexes')
-    m.index = self.free_indexes.pop(0)
+    m.index = index
     m.color = m.horiz = m.vert = m.uprate = m.leds = 0
     #print 'update kw=', kw
     m.__dict__.update(kw)
     self.modules.append(m)
+    self.modules_by_index[index] = m
     return m
 
   def del_module(self, module):
@@ -151,9 +244,43 @@ for the voice and fx areas of a nord modules g2 patch.
 
 \tdelete module from modules sequence.
 '''
-    self.free_indexes.insert(0, module.index)
+    heappush(self.free_indexes, module.index)
+    del self.modules_by_index[module.index]
     self.modules.remove(module)
 
+  def copy_variation(self, src, dest):
+    '''copy_variation(src, dest) -> None
+
+\tcopy the parameter values of variation src to variation dest.
+'''
+    for module in self.modules:
+      n = len(module.params)
+      module.values[dest*n:(dest+1)*n] = module.values[src*n:(src+1)*n]
+
+  def init_variation(self, variation):
+    '''init_variation(variation) -> None
+
+\tset the parameters of variation to their default values.
+'''
+    for module in self.modules:
+      n = len(module.params)
+      defaults = prototype(module.type).values
+      module.values[variation*n:(variation+1)*n] = defaults[:n]
+
+  def diff_variations(self, a, b):
+    '''diff_variations(a, b) -> list of params that differ
+
+\tparameters whose values differ between variation a and b.
+'''
+    params = []
+    for module in self.modules:
+      n = len(module.params)
+      va, vb = module.values[a*n:(a+1)*n], module.values[b*n:(b+1)*n]
+      if va != vb:
+        params.extend([ param for param, x, y in zip(module.params, va, vb)
+            if x != y ])
+    return params
+
 
   def connect(self, source, dest, color):
     '''connect(source, dest, color) -> None
@@ -162,6 +289,14 @@ for the voice and fx areas of a nord modules g2 patch.
 \tcolor is in nord.g2.colors.g2cablecolors or nord.nm1.colors.nm1cablecolors.
 
 \tcannot connect 2 Outputs together.
+'''
+    cable = self.add_cable(source, dest, color)
+    self.netlist.add(cable.source, cable.dest)
+
+  def add_cable(self, source, dest, color):
+    '''add_cable(source, dest, color) -> cable
+
+\tadd a cable from source port to dest port without updating the netlist.
 '''
     sid = (source.module.index << 16) + source.index
     did = (dest.module.index << 16) + dest.index
@@ -178,48 +313,31 @@ for the voice and fx areas of a nord modules g2 patch.
 
     cable.dest = dest
     dest.cables.append(cable)
-
-    self.netlist.add(source, dest)
+    return cable
 
   def disconnect(self, cable):
     '''disconnect(cable) -> None
 
 \tdisconnect a input or output port - update all cables connected to port
 '''
-    source, dest = cable.source, cable.dest
-
-    #printf('disconnect %s:%s -> %s:%s\n' (
-    #  cable.source.module.name, cable.source.type.name,
-    #  cable.dest.module.name, cable.dest.type.name)
-    #printf(' cable %s', self.netlist.nettos(cable.source.net))
-
-    # collect all the cables on the net
-    cables = []
-    for input in source.net.inputs:
-      for c in input.cables:
-        if not c in cables:
-          cables.append(c)
-
-    cables.remove(cable)
-    source.cables.remove(cable)
-    dest.cables.remove(cable)
-    self.cables.remove(cable)
-    self.netlist.delete(source, dest)
-
-    source.net = dest.net = None
-    for c in cables:
-      #printf('connect\n source %s\n', self.netlist.nettos(c.source.net))
-      #printf(' dest %s\n', self.netlist.nettos(c.dest.net))
-      self.netlist.add(c.source, c.dest)
-
-    #printf('after disconnect\n source %s\n', self.netlist.nettos(source.net))
-    #printf(' dest %s\n', self.netlist.nettos(dest.net))
-
-  def removeconnector(self, connector):
-    '''removeconnector(connector) -> connector
+    rewire = self.rewire()
+    rewire.disconnect(cable)
+    rewire.commit()
+
+  def rewire(self):
+    '''rewire() -> Rewire
+
+\tstart a batch of disconnects and connects, see Rewire.
+'''
+    return Rewire(self)
+
+  def removeconnector(self, connector, rewire=None):
+    '''removeconnector(connector, rewire=None) -> connector
 
 \tremove connector from the cable net and cable connections.
 \tconnector is a member of the Module object.
+\tthe changes are added to rewire when given (the caller commits it),
+otherwise they are committed before returning.
 '''
     connectors = []
     minconn = None
@@ -228,15 +346,22 @@ for the voice and fx areas of a nord modules g2 patch.
     #printf('removeconnector %s:%s\n', connector.module.name,
     #       connector.type.name)
     #printf('before remove %s\n', self.netlist.nettos(connector.net))
-    while len(connector.cables):
-      cable = connector.cables[0]
-      source, dest = cable.source, cable.dest
-      self.disconnect(cable)
-      if connector == source:
-        other = dest
+    if rewire:
+      batch = rewire
+    else:
+      batch = self.rewire()
+    others = []
+    for cable in connector.cables[:]:
+      batch.disconnect(cable)
+      if connector == cable.source:
+        others.append(cable.dest)
       else:
-        other = source
-      dist = self.connection_length(connector, other)
+        others.append(cable.source)
+
+    cx, cy = connector_coords(connector)
+    x, y = self.connector_coords(others)
+    for other, ox, oy in zip(others, x, y):
+      dist = (ox-cx)**2+(oy-cy)**2
       if dist < mindist:
         if minconn:
           connectors.append(minconn)
@@ -245,16 +370,16 @@ for the voice and fx areas of a nord modules g2 patch.
       elif not other in connectors:
         connectors.append(other)
 
-    if len(connectors) != 0:
-      for connector in connectors:
-        #printf(' new %s:%s -> %s:%s\n', minconn.module.name, minconn.type.name,
-        #    connector.module.name, connector.type.name)
-        if minconn.direction:
-          self.connect(minconn, connector, 0)
-        else:
-          self.connect(connector, minconn, 0)
-        #printf(' done %s\n', self.netlist.nettos(connector.net))
+    for connector in connectors:
+      #printf(' new %s:%s -> %s:%s\n', minconn.module.name, minconn.type.name,
+      #    connector.module.name, connector.type.name)
+      if minconn.direction:
+        batch.connect(minconn, connector, 0)
+      else:
+        batch.connect(connector, minconn, 0)
 
+    if not rewire:
+      batch.commit()
     #printf('after remove %s\n', self.netlist.nettos(minconn.net))
     return minconn
 
@@ -267,54 +392,78 @@ for the voice and fx areas of a nord modules g2 patch.
   def connection_length(self, start, end):
     '''connection_length(start, end) -> distance from start port to end port'''
     # horiz coordinates about 20 times bigger.
-    sm, em = start.module, end.module
-    dh = (19*em.horiz+end.type.horiz)-(19*sm.horiz+start.type.horiz)
-    dv = (em.vert+end.type.vert)-(sm.vert+start.type.vert)
-    return (dh**2)+(dv**2)
+    sx, sy = connector_coords(start)
+    ex, ey = connector_coords(end)
+    return (ex-sx)**2+(ey-sy)**2
+
+  def connector_coords(self, conns):
+    '''connector_coords(conns) -> (xs, ys) lists of connector coordinates'''
+    xys = [ connector_coords(c) for c in conns ]
+    return [ x for x, y in xys ], [ y for x, y in xys ]
+
+  def spanning_tree(self, conns):
+    '''spanning_tree(conns) -> list of [fromconn, toconn] pairs
+
+\tminimum spanning tree of connectors conns rooted at conns[0] (Prim).
+Pairs are in the order they are found, fromconn is always connected.
+Equal lengths pick the earliest connected connector then the earliest
+in conns.
+'''
+    x, y = self.connector_coords(conns)
+    # best[i] = (length, position in tree of the closest connected connector)
+    best = [ ((x[i]-x[0])**2+(y[i]-y[0])**2, 0) for i in range(len(conns)) ]
+    left = range(1, len(conns))
+    tree = [0]
+    pairs = []
+    while left:
+      i = min(left, key=lambda i: (best[i], i))
+      left.remove(i)
+      pairs.append([conns[tree[best[i][1]]], conns[i]])
+      tree.append(i)
+      pos = len(tree) - 1
+      xi, yi = x[i], y[i]
+      for j in left:
+        length = (x[j]-xi)**2+(y[j]-yi)**2
+        if length < best[j][0]:
+          best[j] = (length, pos)
+    return pairs
+
+  def graph(self):
+    '''graph() -> AreaGraph
+
+\tinteger snapshot of the modules, connectors, nets and cables of the area
+for analysis (see nord.graph).  make it once and keep it while the area
+does not change.
+'''
+    return AreaGraph(self)
 
   def shorten_cables(self):
     '''shorten_cables()
 
 \tmake all cable as short as possible.
 '''
-    # copy netlist before changes for later
-    netlist = self.netlist.copy()
+    # keep the nets and the color of the first cable of each net
+    nets = self.netlist.nets
+    colors = {}
+    for cable in self.cables:
+      colors.setdefault(cable.source.net, cable.color)
 
     # remove all cables
-    cables = self.cables[:]
-    while len(cables):
-      cable = cables.pop(0)
-      cable.source.net.color = cable.color
-      self.disconnect(cable)
-
-    def findclosest(g2area, fromlist, tolist):
-      mincablelen = 1000000
-      mincable = None
-      for fromconn in fromlist:
-        for toconn in tolist:
-          cablelen = g2area.connection_length(fromconn, toconn)
-          if cablelen < mincablelen:
-            mincablelen = cablelen
-            mincable = [fromconn, toconn]
-      return mincable
-
-    # on each net, successively connect closet connector
-    # net list will change while modifying so we need a static copy
-    for net in netlist.nets:
-      inputs = net.inputs
+    for cable in self.cables:
+      for conn in [cable.source, cable.dest]:
+        conn.cables = []
+        conn.net = None
+    self.cables = []
+    self.netlist = NetList()
+
+    # rewire each net as a spanning tree from its output (or first input)
+    for net in nets:
       if net.output:
-        fromconn, toconn = findclosest(self, [net.output], inputs)
+        conns = [net.output] + net.inputs
       else:
-        conn = inputs.pop(0)
-        fromconn, toconn = findclosest(self, [conn], inputs)
-      self.connect(fromconn, toconn, net.color)
-      inputs.remove(toconn)
-      connected = [fromconn, toconn]
-      while len(inputs):
-        fromconn, toconn = findclosest(self, connected, inputs)
-        self.connect(fromconn, toconn, net.color)
-        inputs.remove(toconn)
-        connected.append(toconn)
+        conns = net.inputs
+      for fromconn, toconn in self.spanning_tree(conns):
+        self.connect(fromconn, toconn, colors[net])
 
 class Patch(object):
   '''Patch class for a nord modular patch.
@@ -1,6 +1,32 @@
 
 from cpython.buffer cimport *
 
+cdef extern from "Python.h":
+  int PyObject_AsReadBuffer(object o, const void **buf, Py_ssize_t *len) except -1
+
+cdef class ReadBuffer(object):
+  '''ReadBuffer(data) -> read-only buffer of an old style buffer object
+
+Lets memoryview(), crc() and BitStream use an mmap without copying it.
+The data object is kept alive as long as the ReadBuffer is.
+'''
+  cdef object data
+  cdef const void *buf
+  cdef Py_ssize_t len
+
+  def __init__(self, object data):
+    PyObject_AsReadBuffer(data, &self.buf, &self.len)
+    self.data = data
+
+  def __len__(self):
+    return self.len
+
+  def __getbuffer__(self, Py_buffer *info, int flags):
+    PyBuffer_FillInfo(info, self, <void *>self.buf, self.len, 1, flags)
+
+  def __releasebuffer__(self, Py_buffer *info):
+    pass
+
 cdef unsigned short crc_table[256]
 crc_table[:] = [
     0x0000, 0x1021, 0x2042, 0x3063, 0x4084, 0x50a5, 0x60c6, 0x70e7,
@@ -37,12 +63,13 @@ crc_table[:] = [
     0x6e17, 0x7e36, 0x4e55, 0x5e74, 0x2e93, 0x3eb2, 0x0ed1, 0x1ef0,
   ]
 
-cpdef unsigned short crc(o):
-  '''crc(string) -> crc
+cpdef unsigned short crc(o, unsigned int icrc=0):
+  '''crc(string, icrc=0) -> crc
 
 Calculate the crc of a string used in the nord g2 pch2 and prf2 file.
+icrc continues a crc from a previous call.
 '''
-  cdef unsigned int crc = 0
+  cdef unsigned int crc = icrc & 0xffff
   cdef int i, ti
   cdef Py_buffer info
   cdef char *s
@@ -100,6 +127,7 @@ cdef class BitStream(object):
   cdef int bit
   cdef object data
   cdef Py_buffer info
+  cdef int readonly
 
   def __init__(self, object data, int bit=0):
     self.data = None
@@ -115,8 +143,10 @@ cdef class BitStream(object):
 
     if data != None:
       self.data = data
-      if PyObject_GetBuffer(data, &self.info, PyBUF_WRITEABLE|PyBUF_C_CONTIGUOUS) < 0:
-        raise Exception('Not a buffer, writable, or contiguous')
+      # read-only buffers (mmap) can be parsed, write_bits() refuses them
+      if PyObject_GetBuffer(data, &self.info, PyBUF_C_CONTIGUOUS) < 0:
+        raise Exception('Not a buffer, or contiguous')
+      self.readonly = self.info.readonly
 
   cpdef int read_bits(self, int nbits, int sign=0):
     cdef int byte = self.bit >> 3
@@ -138,8 +168,12 @@ cdef class BitStream(object):
   def tell_bit(self):
     return self.bit
 
-  def read_bitsa(self, nbitsa):
-    return [ self.read_bits(nbits) for nbits in nbitsa ]
+  cpdef list read_bitsa(self, object nbitsa):
+    cdef list values = []
+    cdef int nbits
+    for nbits in nbitsa:
+      values.append(self.read_bits(nbits))
+    return values
 
   def read_bytes(self, int nbytes):
     return [ self.read_bits(8) for i in xrange(nbytes) ]
@@ -147,13 +181,16 @@ cdef class BitStream(object):
   def read_str(self, int nbytes):
     return str(bytearray(self.read_bytes(nbytes)))
 
-  def write_bits(self, int nbits, int value):
+  cpdef write_bits(self, int nbits, int value):
     cdef int byte = self.bit >> 3
     cdef short *sp = <short *>(self.info.buf + byte)
+    if self.readonly:
+      raise Exception('Buffer is read-only')
     sp[0] = bswap16(_setbits(bswap16(sp[0]), 16-(self.bit&7)-nbits, nbits, value))
     self.bit += nbits
 
-  def write_bitsa(self, object nbitsa, object values):
+  cpdef write_bitsa(self, object nbitsa, object values):
+    cdef int nbits, value
     for nbits, value in zip(nbitsa, values):
       self.write_bits(nbits, value)
 
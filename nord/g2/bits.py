@@ -21,6 +21,16 @@
 
 import struct
 from array import array
+from binascii import hexlify, unhexlify
+from operator import attrgetter
+
+def store(data, byte, last, s):
+  '''store(data, byte, last, s) - set data[byte:last] to byte string s.
+  data is a bytearray, writable memoryview or array('B').
+'''
+  if isinstance(data, array):
+    s = array('B', s)
+  data[byte:last] = s
 
 # number format for getbits() and setbits()
 # b       b       b       b
@@ -42,7 +52,8 @@ def getbits(bit, nbits, data, signed=0):
   # grab 32-bits starting with the byte that contains bit
   byte = bit >> 3
   # align size to a 32-bit word
-  long_ = struct.unpack('>L', (str(data[byte:byte+4])+'\x00'*4)[:4])[0]
+  long_ = struct.unpack('>L',
+      (str(bytearray(data[byte:byte+4]))+'\x00'*4)[:4])[0]
   val = getbits_(long_, 32-(bit&7)-nbits, nbits)
   if signed and (val>>(nbits-1)):
     val |= ~0 << nbits
@@ -58,17 +69,84 @@ def setbits(bit, nbits, data, value):
   # grab 32-bits starting with the byte that contains bit
   byte = bit >> 3
   last = (bit+nbits+7)>>3
-  s = data[byte:byte+4].tostring()
+  s = (str(bytearray(data[byte:byte+4]))+'\x00'*4)[:4]
   # align size to a 32-bit word
   long_ = setbits_(struct.unpack('>L', s)[0], 32-(bit&7)-nbits, nbits, value)
-  # readjust array to fit (bits+nbits)/8 bytes
-  a = array('B', struct.pack('>L', long_)[:last-byte])
-  #printf('bit=%d nbits=%d byte=%d last=%d last-byte+1=%d len=%d len(a)=%d\n',
-  #   bit, nbits, byte, last, last-byte, len(data), len(a))
-  data[byte:last] = a
+  # readjust to fit (bits+nbits)/8 bytes
+  store(data, byte, last, struct.pack('>L', long_)[:last-byte])
   #printf('%s\n', data)
   return bit+nbits
 
+def getbitsa(bit, nbitsa, data):
+  '''getbitsa(bit, nbitsa, data) - return (bit, list of ints) for a record
+  of consecutive fields nbitsa bits wide.  the record is unpacked as one
+  number instead of a getbits() call per field.
+'''
+  byte = bit >> 3
+  last = (bit+sum(nbitsa)+7) >> 3
+  long_ = int(hexlify(bytearray(data[byte:last])) or '0', 16)
+  pos = (last<<3) - bit
+  values = []
+  for nbits in nbitsa:
+    pos -= nbits
+    values.append(int((long_>>pos) & ~(~0<<nbits)))
+  return (last<<3)-pos, values
+
+def setbitsa(bit, nbitsa, data, values):
+  '''setbitsa(bit, nbitsa, data, values) - set a record of consecutive
+  fields nbitsa bits wide in data from values with one pack.
+'''
+  byte = bit >> 3
+  last = (bit+sum(nbitsa)+7) >> 3
+  long_ = int(hexlify(bytearray(data[byte:last])) or '0', 16)
+  pos = (last<<3) - bit
+  for nbits, value in zip(nbitsa, values):
+    pos -= nbits
+    m = ~(~0<<nbits)
+    long_ = (long_&~(m<<pos))|((m&value)<<pos)
+  store(data, byte, last, unhexlify('%0*x' % ((last-byte)*2, long_)))
+  return (last<<3)-pos
+
+class BitLayout(object):
+  '''BitLayout(fields) - compiled bit-field record layout.
+
+  fields is a list of [name, nbits] in stream order.  the names and
+  widths are split once so a whole record is decoded or encoded with
+  a single BitStream.read_bitsa()/write_bitsa() call.
+'''
+  def __init__(self, fields):
+    self.fields = fields
+    self.names = tuple([ name for name, nbits in fields ])
+    self.nbitsa = tuple([ nbits for name, nbits in fields ])
+    self.nbits = sum(self.nbitsa)
+    if len(self.names) == 1:
+      getter = attrgetter(self.names[0])
+      self.getter = lambda obj: (getter(obj),)
+    else:
+      self.getter = attrgetter(*self.names)
+
+  def read(self, bitstream):
+    '''read(bitstream) -> tuple of field values.'''
+    return tuple(bitstream.read_bitsa(self.nbitsa))
+
+  def read_attrs(self, bitstream, obj):
+    '''read_attrs(bitstream, obj) - read fields into attributes of obj.'''
+    values = bitstream.read_bitsa(self.nbitsa)
+    if hasattr(obj, '__dict__'):
+      obj.__dict__.update(zip(self.names, values))
+    else: # __slots__ object
+      for name, value in zip(self.names, values):
+        setattr(obj, name, value)
+    return obj
+
+  def write(self, bitstream, values):
+    '''write(bitstream, values) - write a sequence of field values.'''
+    bitstream.write_bitsa(self.nbitsa, values)
+
+  def write_attrs(self, bitstream, obj):
+    '''write_attrs(bitstream, obj) - write fields from attributes of obj.'''
+    bitstream.write_bitsa(self.nbitsa, self.getter(obj))
+
 class BitStream(object):
   def __init__(self, data, bit=0):
     self.data = data
@@ -79,12 +157,13 @@ class BitStream(object):
     if data:
       self.data = data
 
-  def read_bits(self, nbits):
-    self.bit, value = getbits(self.bit, nbits, self.data)
+  def read_bits(self, nbits, sign=0):
+    self.bit, value = getbits(self.bit, nbits, self.data, sign)
     return value
 
   def read_bitsa(self, nbitsa):
-    return [ self.read_bits(nbits) for nbits in nbitsa ]
+    self.bit, values = getbitsa(self.bit, nbitsa, self.data)
+    return values
 
   def read_bytes(self, nbytes):
     return [ self.read_bits(8) for byte in xrange(nbytes) ]
@@ -110,8 +189,7 @@ class BitStream(object):
     self.bit = setbits(self.bit, nbits, self.data, value)
 
   def write_bitsa(self, nbitsa, values):
-    for nbits, value in zip(nbitsa, values):
-      self.write_bits(nbits, value)
+    self.bit = setbitsa(self.bit, nbitsa, self.data, values)
 
   def write_bytes(self, bytes):
     for byte in bytes:
@@ -124,8 +202,12 @@ class BitStream(object):
   def string(self):
     return str(self.data[:(self.bit+7)>>3])
 
+def ReadBuffer(data):
+  '''ReadBuffer(data) -> copy of an old style buffer object (mmap).'''
+  return bytearray(data[:])
+
 try:
-  from nord.g2._bits import setbits, getbits, BitStream
+  from nord.g2._bits import setbits, getbits, BitStream, ReadBuffer
 except:
   pass
 
@@ -31,10 +31,6 @@ def crc16(val, icrc):
     k <<= 1
   return (icrc<<8)^crc_
 
-def crc(s):
-  '''crc(s) - calculate crc of whole string.'''
-  return reduce(lambda a, b: crc16(ord(b), a), s, 0) & 0xffff
-
 # calculated via:
 # ./pycrc.py --model zmodem --algorithm table-driven --table-idx-width 8 \
 #     --generate c -o crc.c
@@ -73,13 +69,54 @@ crctab = [
   0x6e17, 0x7e36, 0x4e55, 0x5e74, 0x2e93, 0x3eb2, 0x0ed1, 0x1ef0
 ]
 
-def crc_(s):
-  '''crc(s) - calculate crc of whole string fast.'''
-  return reduce(lambda crc, c:
-      (crctab[((crc>>8)^ord(c))&0xff]^(crc << 8)), s, 0)&0xffff
+def crc_tables(n):
+  '''crc_tables(n) -> tables for slicing crc n bytes at a time.
+
+table[k][b] is the crc of byte b followed by k zero bytes.
+'''
+  tables = [crctab]
+  for k in xrange(1, n):
+    tables.append([((t<<8)&0xffff)^crctab[t>>8] for t in tables[-1]])
+  return tables
+
+crctabs = crc_tables(4)
+
+def crc_(s, icrc=0):
+  '''crc(s, icrc=0) - calculate crc of whole string fast.
+
+s can be a str, bytearray, memoryview or list of byte values.
+icrc continues a crc from a previous call.
+'''
+  t0, t1, t2, t3 = crctabs
+  d = bytearray(s)
+  l = len(d)
+  n = l & ~3
+  crc = icrc & 0xffff
+  for i in xrange(0, n, 4):
+    crc = t3[d[i]^(crc>>8)]^t2[d[i+1]^(crc&0xff)]^t1[d[i+2]]^t0[d[i+3]]
+  for i in xrange(n, l):
+    crc = ((crc<<8)&0xffff)^t0[(crc>>8)^d[i]]
+  return crc
 
 try:
   from nord.g2._bits import crc
 except:
   crc = crc_
 
+class Crc(object):
+  '''Crc(s='') - incremental crc of a nord g2 file or usb message.'''
+  def __init__(self, s=''):
+    self.crc = 0
+    self.update(s)
+
+  def update(self, s):
+    '''update(s) - add s to the crc.'''
+    self.crc = crc(s, self.crc)
+
+  def digest(self):
+    '''digest() -> crc as a big endian 2 byte string.'''
+    return chr(self.crc>>8)+chr(self.crc&0xff)
+
+  def hexdigest(self):
+    return '%04x' % self.crc
+
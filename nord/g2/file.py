@@ -19,17 +19,20 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 #
 
-import string, sys
+import mmap, string, sys
+from array import array
 from struct import pack, unpack
 
 import nord.g2.modules
 from nord import printf
 from nord.module import Module
+from nord.net import Net
 from nord.file import hexdump, binhexdump
-from nord.file import Patch, Performance, Note, Cable, Knob, Ctrl, MorphMap
+from nord.file import Area, Patch, Performance
+from nord.file import Note, Cable, Knob, Ctrl, MorphMap
 from nord.g2 import modules
-from nord.g2.crc import crc
-from nord.g2.bits import setbits, getbits, BitStream
+from nord.g2.crc import crc, Crc
+from nord.g2.bits import setbits, getbits, BitStream, BitLayout, ReadBuffer
 
 section_debug = 0 # outputs section debug 
 title_section = 0 # replace end of section with section title
@@ -77,15 +80,16 @@ def get_patch_area(patch, area):
 class Section(object):
   '''Section abstract class that represents a section of .pch2 file.
   all sections objects have parse() and format() methods.
+  parse() works directly on the data it's given and keeps no state so
+  one object of each section can be shared by all parsers.
 '''
-  default = [0] * (2 << 10) # max 64k section size
   def __init__(self, **kw):
     self.__dict__ = kw
-    self.data = bytearray(64<<10)
 
 class SectionManager(object):
+  '''SectionManager - shared section object for each section type.'''
   def add(self, class_):
-    self.__dict__[class_.type] = class_
+    self.__dict__[class_.type] = class_()
 
   def get(self, type, default=None):
     return self.__dict__.get(type, default)
@@ -94,7 +98,16 @@ section_manager = SectionManager()
 
 class Description(object):
   '''Description class for patch/performance description.'''
-  pass
+  __slots__ = (
+    # patch
+    'reserved', 'voices', 'height', 'unk2', 'red', 'blue', 'yellow',
+    'orange', 'green', 'purple', 'white', 'monopoly', 'variation', 'category',
+    # performance
+    'unk1', 'focus', 'unk3', 'rangesel', 'bpm', 'split', 'clock', 'unk4',
+    'unk5',
+    # performance slot
+    'active', 'keyboard', 'hold', 'bank', 'patch', 'keylow', 'keyhigh',
+  )
 
 class PatchDescription(Section):
   '''PatchDescription Section subclass'''
@@ -105,13 +118,12 @@ class PatchDescription(Section):
     ['green', 1], ['purple', 1], ['white', 1],
     ['monopoly', 2], ['variation', 8], ['category', 8],
   ]
+  description_layout = BitLayout(description_attrs)
   def parse_description(self, description, bitstream):
-    for name, nbits in self.description_attrs:
-      setattr(description, name, bitstream.read_bits(nbits))
+    self.description_layout.read_attrs(bitstream, description)
 
   def format_description(self, description, bitstream):
-    for name, nbits in self.description_attrs:
-      bitstream.write_bits(nbits, getattr(description, name))
+    self.description_layout.write_attrs(bitstream, description)
     bitstream.write_bits(8, 0)
 
   def parse(self, patch, data):
@@ -155,8 +167,10 @@ class ModuleList(Section):
     ['index', 8 ], ['horiz', 7], ['vert', 7], ['color', 8],
     ['uprate', 1 ], ['leds', 1], ['reserved', 6],
   ]
+  module_layout = BitLayout(module_params)
   def parse_area(self, area, bitstream):
     read_bits = bitstream.read_bits
+    read_module = self.module_layout.read_attrs
     nmodules  = read_bits(8)
     area.modules = [ None ] * nmodules
     for i in xrange(nmodules):
@@ -164,8 +178,7 @@ class ModuleList(Section):
       module = Module(modules.fromid(id), area)
       area.modules[i] = module
 
-      for attr, nbits in self.module_params:
-        setattr(module, attr, read_bits(nbits))
+      read_module(bitstream, module)
       nmodes = read_bits(4)
       self.fixleds(module)
 
@@ -179,17 +192,18 @@ class ModuleList(Section):
       if len(module.modes) < len(module_type.modes):
         for mode in xrange(len(module.modes), len(module_type.modes)):
           module.modes[mode].value = module_type.modes[mode].type.default
+    area.index_modules()
 
   def format_area(self, area, bitstream):
     write_bits = bitstream.write_bits
     write_bits(2, self.area)
     write_bits(8, len(area.modules))
 
+    write_module = self.module_layout.write_attrs
     for module in area.modules:
       write_bits(8, module.type.id)
       module.reserved = 0 # just in case is wasn't set
-      for attr, nbits in self.module_params:
-        bitstream.write_bits(nbits, getattr(module, attr))
+      write_module(bitstream, module)
       self.fixleds(module)
 
       write_bits(4, len(module.modes))
@@ -198,8 +212,7 @@ class ModuleList(Section):
 
   def parse(self, patch, data):
     bitstream = BitStream(data)
-    self.area = bitstream.read_bits(2)
-    area      = get_patch_area(patch, self.area)
+    area      = get_patch_area(patch, bitstream.read_bits(2))
     self.parse_area(area, bitstream)
 
   def format(self, patch, data):
@@ -295,8 +308,7 @@ class CableList(Section):
 
   def parse(self, patch, data):
     bitstream = BitStream(data)
-    self.area = bitstream.read_bits(2)
-    area = get_patch_area(patch, self.area)
+    area = get_patch_area(patch, bitstream.read_bits(2))
     self.parse_area(area, bitstream)
 
   def format(self, patch, data):
@@ -307,17 +319,22 @@ class CableList(Section):
 section_manager.add(CableList)
 
 class SettingsArea(object):
+  __slots__ = ( 'index', 'name' )
   def __init__(self):
     self.index  = SETTINGS
     self.name   = 'settings'
 
 class ParameterModule(object):
+  __slots__ = ( 'area', 'index' )
   def __init__(self, area, index):
     self.area   = area
     self.index  = index
 
 class Parameter(object):
   '''Parameter class for module parameters/settings.'''
+  __slots__ = (
+    'area', 'index', 'variations', 'name', 'module', 'knob', 'mmap', 'ctrl'
+  )
   def __init__(self, area, mod_index, index, default=0, name='', module=None):
     self.area       = area
     self.index      = index
@@ -330,6 +347,7 @@ class Parameter(object):
 
 class Morph(object):
   '''Morph class for morph settings.'''
+  __slots__ = ( 'name', 'maps', 'index', 'area', 'dial', 'mode', 'label' )
   def __init__(self, area, index):
     self.name  = 'morph%d' % (index+1)
     self.maps  = [[] for variation in xrange(NVARIATIONS) ]
@@ -417,19 +435,22 @@ class Parameters(Section):
     return bitstream.tell_bit()
 
   def parse_area(self, area, bitstream):
-    read_bits = bitstream.read_bits
+    read_bitsa = bitstream.read_bitsa
 
-    nmodules, nvariations = bitstream.read_bitsa([8, 8])
+    nmodules, nvariations = read_bitsa([8, 8])
     for i in xrange(nmodules):
-      index, nparams = bitstream.read_bitsa([8, 7])
+      index, nparams = read_bitsa([8, 7])
       module = area.find_module(index)
-      params = module.params
+      # variation number and all its values are read as one record
+      # and stored straight into module.values
+      nbitsa = [8] + [7] * nparams
+      n = min(nparams, len(module.params))
       for i in xrange(nvariations):
-        variation = read_bits(8)
-        for param in xrange(nparams):
-          value = read_bits(7)
-          if param < len(params) and variation < NVARIATIONS:
-            params[param].variations[variation] = value
+        values = read_bitsa(nbitsa)
+        variation = values[0]
+        if variation < NVARIATIONS:
+          start = variation * len(module.params)
+          module.values[start:start+n] = array('h', values[1:n+1])
 
   def format_area(self, area, bitstream):
     modules = []
@@ -454,22 +475,22 @@ class Parameters(Section):
     for module in modules:
       write_bits(8, module.index)
 
-      params = module.params
-      write_bits(7, len(params))
+      n = len(module.params)
+      write_bits(7, n)
+      nbitsa = [8] + [7] * n
+      values = module.values.tolist()
       for variation in xrange(NVARIATIONS):
-        write_bits(8, variation)
-        for param in params:
-          write_bits(7, param.variations[variation])
+        start = variation * n
+        bitstream.write_bitsa(nbitsa, [variation] + values[start:start+n])
 
   def parse(self, patch, data):
     bitstream = BitStream(data)
-    self.area = bitstream.read_bits(2)
-    if self.area == SETTINGS:
+    area = bitstream.read_bits(2)
+    if area == SETTINGS:
       patch.settings = Settings()  # G2Patch
       self.parse_settings(patch.settings, bitstream)
     else:
-      area = get_patch_area(patch, self.area)
-      self.parse_area(area, bitstream)
+      self.parse_area(get_patch_area(patch, area), bitstream)
 
   def format(self, patch, data):
     bitstream = BitStream(data)
@@ -563,6 +584,7 @@ section_manager.add(MorphParameters)
 class KnobAssignments(Section):
   '''KnobAssignments Section subclass'''
   type = 0x62
+  knob_layout = BitLayout([['area', 2], ['index', 8], ['isled', 2], ['param', 7]])
   def parse(self, patch, data):
     bitstream = BitStream(data)
     nknobs = bitstream.read_bits(16)
@@ -571,8 +593,8 @@ class KnobAssignments(Section):
       knob.assigned = bitstream.read_bits(1)
       if not knob.assigned:
         continue
-      area, index, knob.isled, param = bitstream.read_bitsa([2, 8, 2, 7])
-      if type(patch) == Performance:
+      area, index, knob.isled, param = self.knob_layout.read(bitstream)
+      if isinstance(patch, Performance):
         knob.slot = bitstream.read_bits(2)
         perf = patch
         patch = perf.slots[knob.slot].patch
@@ -598,9 +620,9 @@ class KnobAssignments(Section):
       if not knob.assigned:
         continue
       module = knob.param.module
-      bitstream.write_bitsa([2, 8, 2, 7],
+      self.knob_layout.write(bitstream,
           [ module.area.index, module.index, knob.isled, knob.param.index ])
-      if type(patch) == Performance:
+      if isinstance(patch, Performance):
         bitstream.write_bits(2, knob.slot)
     return bitstream.tell_bit()
 section_manager.add(KnobAssignments)
@@ -608,12 +630,13 @@ section_manager.add(KnobAssignments)
 class CtrlAssignments(Section):
   '''CtrlAssignments Section subclass'''
   type = 0x60
+  ctrl_layout = BitLayout([['midicc', 7], ['area', 2], ['index', 8], ['param', 7]])
   def parse(self, patch, data):
     bitstream = BitStream(data)
     nctrls = bitstream.read_bits(7)
     patch.ctrls = [ Ctrl() for i in xrange(nctrls)]  # G2Patch? / G2Ctrl?
     for ctrl in patch.ctrls:
-      ctrl.midicc, area, index, param = bitstream.read_bitsa([7, 2, 8, 7])
+      ctrl.midicc, area, index, param = self.ctrl_layout.read(bitstream)
       if area == SETTINGS:
         ctrl.param = get_settings_param(patch, index, param)
       else:
@@ -626,7 +649,7 @@ class CtrlAssignments(Section):
     bitstream.write_bits(7, len(patch.ctrls))
     for ctrl in patch.ctrls:
       param = ctrl.param
-      bitstream.write_bitsa([7, 2, 8, 7], [ ctrl.midicc,
+      self.ctrl_layout.write(bitstream, [ ctrl.midicc,
           param.module.area.index, param.module.index, param.index ])
     return bitstream.tell_bit()
 section_manager.add(CtrlAssignments)
@@ -721,12 +744,11 @@ class Labels(Section):
 
   def parse(self, patch, data):
     bitstream = BitStream(data)
-    self.area = bitstream.read_bits(2)
-    if self.area == SETTINGS:
+    area = bitstream.read_bits(2)
+    if area == SETTINGS:
       self.parse_morphs(patch.settings.morphs, bitstream)
     else:
-      area = get_patch_area(patch, self.area)
-      self.parse_area(area, bitstream)
+      self.parse_area(get_patch_area(patch, area), bitstream)
 
   def format(self, patch, data):
     bitstream = BitStream(data)
@@ -748,8 +770,7 @@ class ModuleNames(Section):
 
   def parse(self, patch, data):
     bitstream = BitStream(data)
-    self.area = bitstream.read_bits(2)
-    area = get_patch_area(patch, self.area)
+    area = get_patch_area(patch, bitstream.read_bits(2))
     self.parse_area(area, bitstream)
 
   def format_area(self, area, bitstream):
@@ -769,7 +790,7 @@ class TextPad(Section):
   '''TextPad Section subclass'''
   type = 0x6f
   def parse(self, patch, data):
-    patch.textpad = data
+    patch.textpad = data.tobytes() # don't hold on to the file data
 
   def format(self, patch, data):
     bitstream = BitStream(data)
@@ -790,34 +811,28 @@ class PerformanceDescription(Section):
     ['active', 8], ['keyboard', 8], ['hold', 8], ['bank', 8 ], [ 'patch', 8 ],
     ['keylow', 8], ['keyhigh', 8], ['unk3', 8], ['unk4', 8], ['unk5', 8],
   ]
+  description_layout = BitLayout(description_attrs)
+  slot_layout = BitLayout(slot_attrs)
   def parse(self, performance, data):
     description = performance.description = Description() # G2Performance
     bitstream = BitStream(data)
-    read_bits = bitstream.read_bits
 
-    for name, nbits in self.description_attrs:
-      value = read_bits(nbits)
-      setattr(description, name, value)
+    self.description_layout.read_attrs(bitstream, description)
 
     for slot in performance.slots:
       slot.description = Description()
       slot.name = read_string(bitstream, 16)
-      for name, nbits in self.slot_attrs:
-        value = read_bits(nbits)
-        setattr(slot.description, name, value)
+      self.slot_layout.read_attrs(bitstream, slot.description)
 
   def format(self, performance, data):
     bitstream = BitStream(data)
-    write_bits = bitstream.write_bits
     description = performance.description
 
-    for name, nbits in self.description_attrs:
-      write_bits(nbits, getattr(description, name))
+    self.description_layout.write_attrs(bitstream, description)
 
     for slot in performance.slots:
       write_string(bitstream, slot.name, 16)
-      for name, nbits in self.slot_attrs:
-        write_bits(nbits, getattr(slot.description, name))
+      self.slot_layout.write_attrs(bitstream, slot.description)
 
     return bitstream.tell_bit()
 section_manager.add(PerformanceDescription)
@@ -826,6 +841,92 @@ class GlobalKnobAssignments(KnobAssignments):
   '''GlobalKnobAssignments Section subclasss'''
   type = 0x5f
 
+MAX_SECTION = 0xffff # section size is 16-bits
+
+class FormatBuffer(object):
+  '''FormatBuffer(size) - growable buffer files are formatted into.
+
+  sections format in place into the memoryview returned by reserve()
+  and then advance() past the bytes they used.  The buffer grows as
+  needed so there is no limit on the size of the file.
+'''
+  def __init__(self, size=128<<10):
+    self.data = bytearray(size)
+    self.len = 0
+
+  def __len__(self):
+    return self.len
+
+  def reserve(self, size):
+    '''reserve(size) -> memoryview of size bytes at the end of the buffer.
+  no views of the buffer may be held when calling reserve().
+'''
+    end = self.len + size
+    if end > len(self.data):
+      grow = max(end, 2 * len(self.data)) - len(self.data)
+      self.data.extend(bytearray(grow))
+    return memoryview(self.data)[self.len:end]
+
+  def advance(self, size):
+    self.len += size
+
+  def write(self, s):
+    self.reserve(len(s))[:] = s
+    self.advance(len(s))
+
+  def getvalue(self):
+    '''getvalue() -> memoryview of the data formatted so far.'''
+    return memoryview(self.data)[:self.len]
+
+class LazySections(object):
+  '''LazySections - mixin to parse sections when their attributes are used.
+
+  lazy() removes attributes and remembers the sections that set them.
+  the first time one of them is touched its defaults are put back
+  and the sections are parsed, exactly as a full read would have.
+'''
+  def lazy(self, attrs, sections):
+    '''lazy(attrs, sections) - defer sections, a list of
+  (section, patch_or_perf, data), until one of attrs is used.'''
+    defaults = {}
+    for attr in attrs:
+      if attr in self.__dict__:
+        defaults[attr] = self.__dict__.pop(attr)
+    group = (attrs, sections, defaults)
+    pending = self.__dict__.setdefault('lazy_sections', {})
+    for attr in attrs:
+      pending[attr] = group
+
+  def __getattr__(self, name):
+    pending = self.__dict__.get('lazy_sections', {})
+    if not name in pending:
+      raise AttributeError(name)
+    attrs, sections, defaults = pending[name]
+    for attr in attrs:
+      del pending[attr]
+    self.__dict__.update(defaults)
+    for section, patch_or_perf, data in sections:
+      section.parse(patch_or_perf, data)
+    return object.__getattribute__(self, name)
+
+class LazyArea(LazySections, Area):
+  '''LazyArea - Area parsed on first use.'''
+  pass
+
+class LazyPatch(LazySections, Patch):
+  '''LazyPatch - Patch parsed section by section on first use.'''
+  def __init__(self, fromname):
+    Patch.__init__(self, fromname)
+    self.fx = LazyArea(self, fromname, 0, 'fx')
+    self.voice = LazyArea(self, fromname, 1, 'voice')
+
+class LazyPerformance(LazySections, Performance):
+  '''LazyPerformance - Performance with lazy slot patches and knobs.'''
+  def __init__(self, fromname):
+    Performance.__init__(self, fromname)
+    for slot in self.slots:
+      slot.patch = LazyPatch(fromname)
+
 class Pch2File(object):
   '''Pch2File(filename) - main reading/writing object for .pch2 files
    this may become generic G2 file for .pch2 and .prf2 files
@@ -852,6 +953,26 @@ class Pch2File(object):
     ModuleNames(area=0),
     TextPad(),
   ]
+  # sections that start with the 2 bit area they belong to
+  area_sections = [
+    ModuleList.type, CableList.type, Parameters.type,
+    Labels.type, ModuleNames.type,
+  ]
+  # [ attributes, sections that set them ] for lazy reads, in file order
+  lazy_patch_sections = [
+    [ ['description'], [(PatchDescription.type, None)] ],
+    [ ['lastnote', 'notes'], [(CurrentNote.type, None)] ],
+    [ ['settings'], [(Parameters.type, SETTINGS),
+        (MorphParameters.type, None), (Labels.type, SETTINGS)] ],
+    [ ['knobs'], [(KnobAssignments.type, None)] ],
+    [ ['ctrls'], [(CtrlAssignments.type, None)] ],
+    [ ['textpad'], [(TextPad.type, None)] ],
+  ]
+  lazy_area_sections = [
+    [ ['modules', 'modules_by_index', 'free_indexes', 'cables', 'netlist'],
+        [ModuleList.type, CableList.type, Parameters.type, Labels.type,
+        ModuleNames.type] ],
+  ]
   standard_text_header = '''Version=Nord Modular G2 File Format 1\r
 Type=%s\r
 Version=%d\r
@@ -860,12 +981,12 @@ Info=BUILD %d\r
   binary_version = 23
   build_version = 266
 
-  def __init__(self, filename=None):
+  def __init__(self, filename=None, lazy=False, mapped=False):
     self.type = 'Patch'
     self.binary_revision = 0
     self.patch = Patch(nord.g2.modules.fromname)
     if filename:
-      self.read(filename)
+      self.read(filename, lazy, mapped)
 
   def parse_section(self, section, patch_or_perf, memview):
     type, l = unpack('>BH', memview[:3])
@@ -878,20 +999,56 @@ Info=BUILD %d\r
     return memview[l:]
 
   def parse_patch(self, patch, memview):
-    memview = self.parse_section(PatchDescription(), patch, memview)
+    description = section_manager.get(PatchDescription.type)
+    memview = self.parse_section(description, patch, memview)
     while len(memview) > 0:
       type = ord(memview[0])
       if type == PatchDescription.type: # prf2 concats patches
         break
-      section_class = section_manager.get(type, None)
-      if not section_class:
+      section = section_manager.get(type, None)
+      if not section:
         break
-      memview = self.parse_section(section_class(), patch, memview)
+      memview = self.parse_section(section, patch, memview)
     return memview
 
   def parse(self, memview):
     return self.parse_patch(self.patch, memview)
 
+  def index_patch(self, patch, memview):
+    '''index_patch(patch, memview) -> memview after the patch.
+
+  only the section headers are scanned.  each section is parsed when
+  an attribute of patch (or its areas) it sets is first used.
+'''
+    index = {}
+    while len(memview) > 0:
+      type, l = unpack('>BH', memview[:3])
+      if type == PatchDescription.type and index: # prf2 concats patches
+        break
+      if not section_manager.get(type, None):
+        break
+      data = memview[3:l+3]
+      if type in Pch2File.area_sections:
+        index[(type, ord(data[0]) >> 6)] = data
+      else:
+        index[(type, None)] = data
+      memview = memview[l+3:]
+
+    def sections(keys):
+      return [ (section_manager.get(key[0]), patch, index[key])
+          for key in keys if key in index ]
+
+    for attrs, keys in Pch2File.lazy_patch_sections:
+      patch.lazy(attrs, sections(keys))
+    for area in [ patch.voice, patch.fx ]:
+      for attrs, types in Pch2File.lazy_area_sections:
+        area.lazy(attrs, sections([ (type, area.index) for type in types ]))
+    return memview
+
+  def index(self, memview):
+    self.patch = LazyPatch(nord.g2.modules.fromname)
+    return self.index_patch(self.patch, memview)
+
   def parse_header(self, memview, filename):
     header2x = bytearray(memview[:2*len(self.standard_text_header)])
     null = header2x.find('\0')
@@ -906,22 +1063,43 @@ Info=BUILD %d\r
     return memview[null+1:]  # include binhdr for crc
 
   # read - this is where the rubber meets the road.  it start here....
-  def read(self, filename):
+  # lazy only indexes the sections, they are parsed when first used.
+  # mapped parses the file through a read-only mmap instead of copying
+  # it.  nothing decoded refers to the mapping, it is unmapped once
+  # parsed (for lazy, once every section has been parsed).
+  def read(self, filename, lazy=False, mapped=False):
     self.filename = filename
-    self.data = bytearray(open(filename, 'rb').read())
-    memview = self.parse_header(memoryview(self.data), filename)
-    bytes = len(self.parse(memview[2:-2]))
-    ecrc = unpack('>H', self.data[-2:])[0]
+    if mapped:
+      f = open(filename, 'rb')
+      try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      finally:
+        f.close()
+      self.data = None
+      memview = memoryview(ReadBuffer(data))
+    else:
+      data = self.data = bytearray(open(filename, 'rb').read())
+      memview = memoryview(data)
+    memview = self.parse_header(memview, filename)
+    if lazy:
+      bytes = len(self.index(memview[2:-2]))
+    else:
+      bytes = len(self.parse(memview[2:-2]))
+    ecrc = unpack('>H', memview[-2:].tobytes())[0]
     acrc = crc(memview[:-2])
     if ecrc != acrc:
       printf('Bad CRC 0x%x 0x%x\n' % (ecrc, acrc))
 
-  def format_section(self, section, patch_or_perf, memview):
+  def format_section(self, section, patch_or_perf, buf):
     #print section.__class__.__name__
+    # room for type, size, the largest section and one byte the bit
+    # writers may touch past the end.
+    memview = buf.reserve(3 + MAX_SECTION + 1)
     bits = section.format(patch_or_perf, memview[3:]) # skip type, size 
     bytes = (bits + 7) >> 3
     # write type, size
     memview[:3] = pack('>BH', section.type, bytes)
+    buf.advance(bytes + 3)
 
     if section_debug:
       nm = section.__class__.__name__
@@ -932,48 +1110,185 @@ Info=BUILD %d\r
       #if title_section and len(nm) < len(f):
       #  f = nm+f[len(nm):]
 
-    return memview[bytes + 3:]
-
-  def format_patch(self, patch, memview):
+  def format_patch(self, patch, buf):
     for section in Pch2File.patch_sections:
-      memview = self.format_section(section, patch, memview)
-    return memview
+      self.format_section(section, patch, buf)
 
-  def format(self, memview):
-    return self.format_patch(self.patch, memview)
+  def format(self, buf):
+    self.format_patch(self.patch, buf)
 
   def format_file(self):
-    data = bytearray(64<<10)
-    memview = memoryview(data)
+    '''format_file() -> memoryview of the formatted file data.'''
+    buf = FormatBuffer()
     hdr = Pch2File.standard_text_header % (self.type,
         self.binary_version, self.build_version)
-    memview[:len(hdr)] = hdr
-    memview = memview[len(hdr):]
-    #memview = self.format_header(memview)
-    memview[0] = chr(self.binary_version)
-    memview[1] = chr(self.binary_revision)
-    fmemview = self.format(memview[2:])
-    bytes = len(memview) - len(fmemview)
-    data_crc = crc(memview[:bytes])
-    memview[bytes:bytes+2] = pack('>H', crc(memview[:bytes]))
-    bytes = len(data) - len(fmemview) + 2
-    return data[:bytes]
+    buf.write(hdr)
+    start = len(buf)
+    buf.write(chr(self.binary_version) + chr(self.binary_revision))
+    self.format(buf)
+    buf.write(Crc(buf.getvalue()[start:]).digest())
+    return buf.getvalue()
 
   # write - this looks a lot easier then read ehhhh???
   def write(self, filename=None):
     out = open(filename, 'wb')
-    out.write(str(self.format_file()))
+    out.write(self.format_file())
+
+  def copy(self):
+    '''copy() -> Pch2File with an independent copy of patch.'''
+    pch2 = Pch2File()
+    pch2.type = self.type
+    pch2.binary_revision = self.binary_revision
+    for attr in ['filename', 'txthdr', 'binhdr']:
+      if hasattr(self, attr):
+        setattr(pch2, attr, getattr(self, attr))
+    pch2.patch = copy_patch(self.patch)
+    return pch2
+
+def copy_object(obj, cls, params=None):
+  '''copy_object(obj, cls, params=None) -> new cls object with obj's members.
+  a param member is replaced by its copy from params.
+'''
+  new = cls.__new__(cls)
+  for attr in cls.__slots__:
+    if hasattr(obj, attr):
+      setattr(new, attr, getattr(obj, attr))
+  if params and hasattr(obj, 'param'):
+    new.param = params[obj.param]
+  return new
+
+def copy_area(area, new, params):
+  '''copy_area(area, new, params) -> None
+
+\tcopy modules, cables and nets of area into the empty area new.
+\tparams maps each parameter of area to the parameter in new.
+'''
+  skip = ['type', 'area', 'inputs', 'outputs', 'params', 'modes', 'values']
+  for module in area.modules:
+    m = Module(module.type, new)
+    for attr, value in module.__dict__.items():
+      if not attr in skip:
+        setattr(m, attr, value)
+    if hasattr(module, 'editmodes'):
+      m.editmodes = module.editmodes[:]
+    for mode, newmode in zip(module.modes, m.modes):
+      newmode.value = mode.value
+    m.values = array('h', module.values)
+    for param, newparam in zip(module.params, m.params):
+      if hasattr(param, 'labels'):
+        newparam.labels = param.labels[:]
+      params[param] = newparam
+    new.modules.append(m)
+  new.index_modules()
+
+  def conn(c):
+    module = new.find_module(c.module.index)
+    return [module.inputs, module.outputs][c.direction][c.index]
+
+  for cable in area.cables:
+    if not cable:
+      new.cables.append(cable)
+      continue
+    c = Cable(new)
+    c.color = cable.color
+    c.source, c.dest = conn(cable.source), conn(cable.dest)
+    c.source.cables.append(c)
+    c.dest.cables.append(c)
+    new.cables.append(c)
+
+  # rebuild the nets as they are, net.inputs order matters to the converters
+  for net in area.netlist.nets:
+    output = net.output and conn(net.output)
+    newnet = Net(output, [ conn(input) for input in net.inputs ])
+    for c in [output] + newnet.inputs:
+      if c:
+        c.net = newnet
+    new.netlist.append(newnet)
+
+def copy_patch(patch):
+  '''copy_patch(patch) -> Patch
+
+\tcopy patch without reading or parsing any file data.  The copy shares
+nothing mutable with patch so both can be changed independently.
+'''
+  new = Patch(nord.g2.modules.fromname)
+  params = {} # patch parameter -> copied parameter
+  copy_area(patch.voice, new.voice, params)
+  copy_area(patch.fx, new.fx, params)
+
+  if hasattr(patch, 'description'):
+    new.description = copy_object(patch.description, Description)
+
+  if hasattr(patch, 'settings'):
+    settings = new.settings = Settings()
+    for group in Settings.groups:
+      for name in group:
+        param = getattr(patch.settings, name)
+        params[param] = getattr(settings, name)
+    for morph, newmorph in zip(patch.settings.morphs, settings.morphs):
+      params[morph.dial] = newmorph.dial
+      params[morph.mode] = newmorph.mode
+      if hasattr(morph, 'label'):
+        newmorph.label = morph.label
+    for param, newparam in params.items():
+      if isinstance(param, Parameter):
+        newparam.variations = param.variations[:]
+
+    # morph maps may be shared between variations, so copy each one once.
+    morphmaps = {}
+    def copy_morphmap(morph_map):
+      if not morph_map in morphmaps:
+        new_map = copy_object(morph_map, MorphMap, params)
+        if hasattr(morph_map, 'morph'):
+          new_map.morph = settings.morphs[patch.settings.morphs.index(
+              morph_map.morph)]
+        morphmaps[morph_map] = new_map
+      return morphmaps[morph_map]
+    for morph, newmorph in zip(patch.settings.morphs, settings.morphs):
+      newmorph.maps = [ [ copy_morphmap(m) for m in maps ]
+          for maps in morph.maps ]
+    settings.morphmaps = [ [ copy_morphmap(m) for m in maps ]
+        for maps in patch.settings.morphmaps ]
+
+  if hasattr(patch, 'knobs'):
+    new.knobs = [ copy_object(knob, Knob, params) for knob in patch.knobs ]
+    for knob in new.knobs:
+      if hasattr(knob, 'param'):
+        knob.param.knob = knob
+  new.ctrls = [ copy_object(ctrl, Ctrl, params) for ctrl in patch.ctrls ]
+  for ctrl in new.ctrls:
+    ctrl.param.ctrl = ctrl
+
+  if patch.lastnote:
+    new.lastnote = copy_object(patch.lastnote, Note)
+  new.notes = [ copy_object(note, Note) for note in patch.notes ]
+  if hasattr(patch, 'textpad'):
+    new.textpad = str(bytearray(patch.textpad))
+  return new
+
+pch2_templates = {} # filename -> Pch2File, read once per process
+
+def pch2_template(filename):
+  '''pch2_template(filename) -> Pch2File
+
+\treturn a copy of the .pch2 file filename.  The file is only read and
+parsed the first time it's requested, after that a cached copy is used.
+'''
+  template = pch2_templates.get(filename)
+  if not template:
+    template = pch2_templates[filename] = Pch2File(filename)
+  return template.copy()
 
 class Prf2File(Pch2File):
   '''Prf2File(filename) -> load a nord modular g2 performance.'''
-  def __init__(self, filename=None):
+  def __init__(self, filename=None, lazy=False, mapped=False):
     self.type = 'Performance'
     self.binary_revision = 1
     self.performance = Performance(nord.g2.modules.fromname)
     self.performance_section = PerformanceDescription()
     self.globalknobs_section = GlobalKnobAssignments()
     if filename:
-      self.read(filename)
+      self.read(filename, lazy, mapped)
 
   def parse(self, memview):
     performance = self.performance
@@ -985,18 +1300,28 @@ class Prf2File(Pch2File):
     memview = self.parse_section(globalknobs_section, performance, memview)
     return memview
 
-  def format_performance(self, memview):
+  def index(self, memview):
+    performance = self.performance = LazyPerformance(nord.g2.modules.fromname)
+    # the description is small and holds the slot names, parse it now.
+    memview = self.parse_section(self.performance_section, performance, memview)
+    for slot in performance.slots:
+      memview = self.index_patch(slot.patch, memview)
+    type, l = unpack('>BH', memview[:3])
+    performance.lazy(['knobs'],
+        [(self.globalknobs_section, performance, memview[3:l+3])])
+    return memview[l+3:]
+
+  def format_performance(self, buf):
     performance = self.performance
-    performace_section = self.performance_section
+    performance_section = self.performance_section
     globalknobs_section = self.globalknobs_section
-    memview = self.format_section(performance_section, performance, memview)
+    self.format_section(performance_section, performance, buf)
     for slot in performance.slots:
-      memview = self.format_patch(slot.patch, memview)
-    memview = self.format_section(globalknobs_section, performance, memview)
-    return memview
+      self.format_patch(slot.patch, buf)
+    self.format_section(globalknobs_section, performance, buf)
 
-  def format(self, memview):
-    return self.format_performace(memview)
+  def format(self, buf):
+    self.format_performance(buf)
 
 if __name__ == '__main__':
   prog = sys.argv.pop(0)
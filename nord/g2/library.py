@@ -0,0 +1,180 @@
+#
+# library.py - sqlite index of a .pch2 patch library
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import hashlib, os, sqlite3
+from operator import itemgetter
+from nord.g2.file import Pch2File
+from nord.g2.categories import g2categories
+
+description_fields = [
+  'category', 'voices', 'monopoly', 'height', 'variation',
+  'red', 'blue', 'yellow', 'orange', 'green', 'purple', 'white',
+]
+
+# g2categories names in category order, what query() takes as category
+category_names = [ name for name, value in
+    sorted(g2categories.__dict__.items(), key=itemgetter(1))
+    if isinstance(value, int) ]
+
+library_schema = '''
+create table if not exists patches (
+  id integer primary key,
+  filename text unique,
+  mtime real,
+  size integer,
+  sha1 text,
+  %s,
+  modules integer,
+  cables integer
+);
+create table if not exists modules (
+  patch integer references patches(id) on delete cascade,
+  area integer,
+  idx integer,
+  type integer,
+  shortnm text,
+  name text
+);
+create index if not exists modules_patch on modules(patch);
+create index if not exists modules_shortnm on modules(shortnm);
+create index if not exists patches_category on patches(category);
+''' % ',\n  '.join([ '%s integer' % field for field in description_fields ])
+
+def file_sha1(filename):
+  '''file_sha1(filename) -> sha1 hex digest of the contents of filename.'''
+  f = open(filename, 'rb')
+  try:
+    return hashlib.sha1(f.read()).hexdigest()
+  finally:
+    f.close()
+
+class Library(object):
+  '''Library(dbname) - sqlite index of .pch2 descriptions and modules.
+
+  update() only parses files whose mtime or size changed and whose
+  sha1 differs from the indexed one, so re-indexing a library costs
+  a stat() per unchanged file.
+'''
+  def __init__(self, dbname):
+    self.db = sqlite3.connect(dbname)
+    self.db.execute('pragma foreign_keys = on')
+    columns = [ row[1] for row in
+        self.db.execute('pragma table_info(patches)') ]
+    if columns and not 'sha1' in columns:
+      # indexed before the sha1 column, rebuilt by the next update()s
+      self.db.executescript('drop table modules; drop table patches;')
+    self.db.executescript(library_schema)
+
+  def close(self):
+    self.db.commit()
+    self.db.close()
+
+  def update(self, filename):
+    '''update(filename) -> True if filename was (re)indexed.'''
+    filename = os.path.abspath(filename)
+    st = os.stat(filename)
+    row = self.db.execute(
+        'select id, mtime, size, sha1 from patches where filename = ?',
+        (filename,)).fetchone()
+    if row and row[1] == st.st_mtime and row[2] == st.st_size:
+      return False
+    sha1 = file_sha1(filename)
+    if row and row[2] == st.st_size and row[3] == sha1:
+      # touched but not changed
+      self.db.execute('update patches set mtime = ? where id = ?',
+          (st.st_mtime, row[0]))
+      return False
+
+    pch2 = Pch2File(filename, lazy=True, mapped=True)
+    patch = pch2.patch
+    description = patch.description
+    areas = [ patch.voice, patch.fx ]
+    nmodules = sum([ len(area.modules) for area in areas ])
+    ncables = sum([ len([ c for c in area.cables if c ]) for area in areas ])
+
+    if row:
+      self.db.execute('delete from patches where id = ?', (row[0],))
+    fields = ['filename', 'mtime', 'size', 'sha1'] + description_fields + \
+        ['modules', 'cables']
+    values = [ filename, st.st_mtime, st.st_size, sha1 ] + \
+        [ getattr(description, field) for field in description_fields ] + \
+        [ nmodules, ncables ]
+    cursor = self.db.execute('insert into patches (%s) values (%s)' %
+        (', '.join(fields), ', '.join(['?'] * len(fields))), values)
+    id = cursor.lastrowid
+    self.db.executemany('insert into modules values (?, ?, ?, ?, ?, ?)',
+        [ (id, area.index, module.index, module.type.id,
+           module.type.shortnm, module.name)
+          for area in areas for module in area.modules ])
+    return True
+
+  def remove_missing(self):
+    '''remove_missing() -> number of indexed files that no longer exist.'''
+    missing = [ (id,) for id, filename in
+        self.db.execute('select id, filename from patches')
+        if not os.path.exists(filename) ]
+    self.db.executemany('delete from patches where id = ?', missing)
+    return len(missing)
+
+  def query(self, category=None, modules=None, minvoices=None,
+      maxvoices=None, name=None):
+    '''query(...) -> sorted list of filenames matching all arguments.
+
+  category is a g2categories name, modules a list of module shortnms
+  that must all be used, name matches the filename or a module name
+  (sql like pattern).
+'''
+    where, args = [], []
+    if category != None:
+      if not category.lower() in category_names:
+        raise ValueError('unknown category %s (one of %s)' %
+            (category, ', '.join(category_names)))
+      where.append('category = ?')
+      args.append(g2categories[category.lower()])
+    for shortnm in modules or []:
+      where.append(
+          'id in (select patch from modules where shortnm = ?)')
+      args.append(shortnm)
+    if minvoices != None:
+      where.append('voices >= ?')
+      args.append(minvoices)
+    if maxvoices != None:
+      where.append('voices <= ?')
+      args.append(maxvoices)
+    if name != None:
+      where.append('(filename like ? or '
+          'id in (select patch from modules where name like ?))')
+      args.extend([ '%%%s%%' % name ] * 2)
+    sql = 'select filename from patches'
+    if where:
+      sql += ' where ' + ' and '.join(where)
+    return [ row[0] for row in self.db.execute(sql + ' order by filename',
+        args) ]
+
+  def describe(self, filename):
+    '''describe(filename) -> dict of the indexed fields of filename.'''
+    cursor = self.db.execute('select * from patches where filename = ?',
+        (os.path.abspath(filename),))
+    row = cursor.fetchone()
+    if not row:
+      return None
+    return dict(zip([ d[0] for d in cursor.description ], row))
@@ -26,39 +26,35 @@ def midicc_reserved(cc):
   return cc in reservedmidiccs
 
 def handle_uprate(g2area):
-  # parse the entire netlist of the area and .uprate=1 all
-  # modules with blue_red and yellow_orange inputs connected to red outputs.
-  # scan module list until we don't change any modules
-  done = 0
-  while not done:
-    modified = 0
-    for module in g2area.modules:
-      #debug('%s:%s' % (module.name, module.type.shortnm))
-      for minput in module.inputs:
-        if not minput.net:
-          continue
-        #debug(' %s:%d' % (minput.type.name, minput.rate))
-        # try and make all logic run at control rate.
-        if minput.rate == g2conncolors.yellow_orange:
-          minput.rate = g2conncolors.yellow
-          continue
-        if minput.rate != g2conncolors.blue_red:
-          continue
-        if not minput.net.output:
-          continue
-        if minput.net.output.rate == g2conncolors.red:
-          #debug('%s:%s %s' % (
-          #     module.name, minput.type.name, minput.net.output.type.name))
-          modified = 1
-          module.uprate = 1
-          minput.rate = g2conncolors.red
-          # change all outputs to red for next iteration
-          for output in module.outputs:
-            if output.rate == g2conncolors.blue_red:
-              output.rate = g2conncolors.red
-            if output.rate == g2conncolors.yellow_orange:
-              output.rate = g2conncolors.orange
-          break
-    if not modified:
-      done = 1
+  # .uprate=1 all modules with blue_red and yellow_orange inputs connected
+  # to red outputs.  start from the nets driven by red outputs and follow
+  # each module made red forward through its output nets, a net is only
+  # queued when its output turns red so each net is visited once.
+  work = [ net for net in g2area.netlist.nets
+      if net.output and net.output.rate == g2conncolors.red ]
+
+  # try and make all logic run at control rate.
+  for module in g2area.modules:
+    for minput in module.inputs:
+      if minput.net and minput.rate == g2conncolors.yellow_orange:
+        minput.rate = g2conncolors.yellow
+
+  while work:
+    net = work.pop()
+    for minput in net.inputs:
+      if minput.rate != g2conncolors.blue_red:
+        continue
+      #debug('%s:%s %s' % (
+      #     module.name, minput.type.name, net.output.type.name))
+      module = minput.module
+      module.uprate = 1
+      minput.rate = g2conncolors.red
+      # change all outputs to red and queue their nets
+      for output in module.outputs:
+        if output.rate == g2conncolors.blue_red:
+          output.rate = g2conncolors.red
+          if output.net:
+            work.append(output.net)
+        if output.rate == g2conncolors.yellow_orange:
+          output.rate = g2conncolors.orange
 
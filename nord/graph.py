@@ -0,0 +1,124 @@
+#
+# graph.py - integer graph snapshot of a patch area
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+from array import array
+
+def csr(lists):
+  '''csr(lists) -> (start, items) tuples of list of integer lists.
+
+\titems of lists[i] are items[start[i]:start[i+1]].
+'''
+  start, items = [0], []
+  for l in lists:
+    items.extend(l)
+    start.append(len(items))
+  return tuple(start), tuple(items)
+
+class AreaGraph(object):
+  '''AreaGraph(area) - integer snapshot of the modules, connectors, nets
+and cables of an area for graph analysis.
+
+  modules are numbered in area.modules order, connectors module by
+module (inputs before outputs), nets in netlist order and cables in
+area.cables order (invalid cables left out).  everything is in tuples
+indexed by those ids, so the snapshot can not be changed and does not
+follow later changes to the area.
+
+\tmodule_index, module_type, module_uprate\tper module.
+\tmodule_conns\tconnectors of module m are
+\t\tmodule_conns[m] to module_conns[m+1]-1.
+\tconn_module, conn_direction, conn_index, conn_rate, conn_net
+\t\tper connector, conn_net is -1 if not connected.
+\tnet_output\toutput connector of each net (-1 if none).
+\tnet_start, net_inputs\tCSR input connectors of each net.
+\tcable_source, cable_dest, cable_color\tper cable.
+\tadj_start, adj, adj_cable\tCSR cable adjacency of each connector,
+\t\tadj[i] is the connector at the other end of cable adj_cable[i].
+'''
+  def __init__(self, area):
+    self.modules = tuple(area.modules)
+    self.module_index = tuple([ m.index for m in self.modules ])
+    self.module_type = tuple([ m.type.id for m in self.modules ])
+    self.module_uprate = tuple(
+        [ getattr(m, 'uprate', 0) for m in self.modules ])
+
+    self.module_conns, conns = csr(
+        [ list(m.inputs) + list(m.outputs) for m in self.modules ])
+    self.connectors = conns
+    ids = dict([ (conn, i) for i, conn in enumerate(conns) ])
+    self.conn_ids = ids
+    self.conn_module = tuple([ m for m in xrange(len(self.modules))
+        for c in xrange(self.module_conns[m], self.module_conns[m+1]) ])
+    self.conn_direction = tuple([ c.direction for c in conns ])
+    self.conn_index = tuple([ c.index for c in conns ])
+    self.conn_rate = tuple([ c.rate for c in conns ])
+
+    self.nets = area.netlist.nets
+    netids = dict([ (net, i) for i, net in enumerate(self.nets) ])
+    self.conn_net = tuple([ netids.get(c.net, -1) for c in conns ])
+    self.net_output = tuple([ ids.get(net.output, -1) for net in self.nets ])
+    self.net_start, self.net_inputs = csr(
+        [ [ ids[input] for input in net.inputs ] for net in self.nets ])
+
+    self.cables = tuple([ cable for cable in area.cables if cable ])
+    self.cable_source = tuple([ ids[c.source] for c in self.cables ])
+    self.cable_dest = tuple([ ids[c.dest] for c in self.cables ])
+    self.cable_color = tuple([ c.color for c in self.cables ])
+
+    adjacent = [ [] for c in conns ]
+    for i in xrange(len(self.cables)):
+      s, d = self.cable_source[i], self.cable_dest[i]
+      adjacent[s].append((d, i))
+      adjacent[d].append((s, i))
+    self.adj_start, self.adj = csr([ [ c for c, i in l ] for l in adjacent ])
+    self.adj_cable = csr([ [ i for c, i in l ] for l in adjacent ])[1]
+
+  def conn_id(self, conn):
+    '''conn_id(conn) -> id of Input or Output conn'''
+    return self.conn_ids[conn]
+
+  def net_inputs_of(self, net):
+    '''net_inputs_of(net) -> input connector ids of net id'''
+    return self.net_inputs[self.net_start[net]:self.net_start[net+1]]
+
+  def neighbors(self, conn):
+    '''neighbors(conn) -> connector ids cabled to connector id conn'''
+    return self.adj[self.adj_start[conn]:self.adj_start[conn+1]]
+
+  def components(self):
+    '''components() -> array of the cable connected component of each
+connector, components are numbered by their lowest connector id.'''
+    comp = array('i', [-1]) * len(self.connectors)
+    adj_start, adj = self.adj_start, self.adj
+    for root in xrange(len(comp)):
+      if comp[root] >= 0:
+        continue
+      comp[root] = root
+      stack = [root]
+      while stack:
+        c = stack.pop()
+        for i in xrange(adj_start[c], adj_start[c+1]):
+          o = adj[i]
+          if comp[o] < 0:
+            comp[o] = root
+            stack.append(o)
+    return comp
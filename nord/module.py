@@ -20,8 +20,11 @@
 # along with Foobar; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 #
+from array import array
 from nord import printf
 
+NVARIATIONS = 9
+
 class Input(object):
   '''Input IOMember subclass'''
   __slots__ = ( 'module', 'type', 'index', 'rate', 'cables', 'net', 'conv' )
@@ -48,10 +51,67 @@ class Output(object):
     self.cables = []
     self.net = None
 
+class Variations(object):
+  '''Variations class, a list like view of the variations of a Param
+stored in the values of its Module (internal).
+
+\tit has len(), iteration, indexing and slicing (both ways), ==, in,
+index() and count().  for anything else use list(variations).
+\tvalues are kept in an array('h'), so they must be -32768 to 32767,
+others raise OverflowError.
+'''
+  __slots__ = ( 'values', 'start', 'step' )
+  def __init__(self, values, start, step):
+    self.values = values
+    self.start = start
+    self.step = step
+
+  def __len__(self):
+    return NVARIATIONS
+
+  def __iter__(self):
+    return iter(self.values[self.start::self.step])
+
+  def offset(self, variation):
+    if variation < 0:
+      variation += NVARIATIONS
+    if variation < 0 or variation >= NVARIATIONS:
+      raise IndexError('variation index out of range')
+    return self.start + variation * self.step
+
+  def __getitem__(self, variation):
+    if isinstance(variation, slice):
+      return list(self)[variation]
+    return self.values[self.offset(variation)]
+
+  def __setitem__(self, variation, value):
+    if isinstance(variation, slice):
+      variations = list(self)
+      variations[variation] = value
+      self.values[self.start::self.step] = array('h', variations)
+    else:
+      self.values[self.offset(variation)] = value
+
+  def __contains__(self, value):
+    return value in self.values[self.start::self.step]
+
+  def index(self, value):
+    return self.values[self.start::self.step].index(value)
+
+  def count(self, value):
+    return self.values[self.start::self.step].count(value)
+
+  def __eq__(self, other):
+    return list(self) == list(other)
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __repr__(self):
+    return repr(list(self))
+
 class Param(object):
-  __slots__ = (
-    'module', 'type', 'index', 'variations', 'knob', 'ctrl', 'morph', 'labels'
-  )
+  __slots__ = ( 'module', 'type', 'index', 'knob', 'ctrl', 'morph', 'labels' )
   '''Param class representing dynamic parameters for a nord modular Module.'''
   def __init__(self, module, type, index):
     '''Param(module, type, index) -> Param object
@@ -66,12 +126,20 @@ class Param(object):
     self.module = module
     self.type = type
     self.index = index
-    self.variations = [ type.type.default ] * 9
     self.knob = None
     self.ctrl = None
     self.morph = None
     if len(type.labels):
-      self.labels = type.labels[:] # make a copy so they can be changed.
+      # shared with the type, labels are replaced never changed in place.
+      self.labels = type.labels
+
+  # variations live in module.values, variation by variation
+  def getvariations(self):
+    return Variations(self.module.values, self.index, len(self.module.params))
+  def setvariations(self, variations):
+    self.module.values[self.index::len(self.module.params)] = \
+        array('h', variations)
+  variations = property(getvariations, setvariations)
 
 class Mode(object):
   __slots__ = ( 'module', 'type', 'index', 'value' )
@@ -84,17 +152,62 @@ class Mode(object):
     self.value = type.type.default
 
 class Array(list):
-  '''Array class for managing arrays within a Module object (internal).'''
-  def __init__(self, parent, items, item_class):
-    self[:] = [ item_class(parent, e, i) for i, e in enumerate(items) ]
-    for o in self:
-      self.__dict__[o.type.name] = o
+  '''Array class for managing arrays within a Module object (internal).
 
-  #def __setattr__(self, nm, val):
-  #  self.__dict__[nm] = val
+\tsubclasses made by array_class() hold the types and an ItemName
+per type name, instances only hold the items (and a __dict__ made
+when a name is assigned).
+'''
+  __slots__ = ( '__dict__', )
+  items = [] # (index, type)
+  item_class = None
+  def __init__(self, parent):
+    if self.items:
+      item_class = self.item_class
+      list.__init__(self, [ item_class(parent, t, i) for i, t in self.items ])
 
-  #def __getattr__(self, nm):
-  #  return self.__dict__[nm]
+class ItemName(object):
+  '''ItemName(index) - item index of an Array read by name (internal).
+
+\tnot a data descriptor, so array.Name = value rebinds Name on that
+array only and leaves the items alone, as the per array names did.
+'''
+  __slots__ = ( 'index', )
+  def __init__(self, index):
+    self.index = index
+
+  def __get__(self, array, cls):
+    if array is None:
+      return self
+    return array[self.index]
+
+def array_class(types, item_class):
+  '''array_class(types, item_class) -> Array subclass for types.'''
+  attrs = { '__slots__': (), 'items': list(enumerate(types)),
+      'item_class': item_class }
+  for i, t in enumerate(types):
+    attrs[t.name] = ItemName(i)
+  return type(item_class.__name__ + 'Array', (Array,), attrs)
+
+class Prototype(object):
+  '''Prototype class holding what all modules of a type share (internal).'''
+  def __init__(self, type):
+    '''Prototype(type) -> Prototype object'''
+    self.inputs  = array_class(type.inputs,  Input)
+    self.outputs = array_class(type.outputs, Output)
+    self.params  = array_class(type.params,  Param)
+    self.modes   = array_class(type.modes,   Mode)
+    # param values of all variations, variation after variation
+    self.values = array('h',
+        [ param.type.default for param in type.params ] * NVARIATIONS)
+
+prototypes = {}
+def prototype(type):
+  '''prototype(type) -> Prototype of module type (made on first use).'''
+  proto = prototypes.get(type)
+  if not proto:
+    proto = prototypes[type] = Prototype(type)
+  return proto
 
 class Module(object):
   '''Module class representing a nord modular module within a patch.'''
@@ -106,10 +219,12 @@ class Module(object):
     self.area = area
     self.__dict__.update(kw)
 
-    self.inputs  = Array(self, type.inputs,  Input)
-    self.outputs = Array(self, type.outputs, Output)
-    self.params  = Array(self, type.params,  Param)
-    self.modes   = Array(self, type.modes,   Mode)
+    proto = prototype(type)
+    self.values = array('h', proto.values)
+    self.inputs  = proto.inputs(self)
+    self.outputs = proto.outputs(self)
+    self.params  = proto.params(self)
+    self.modes   = proto.modes(self)
 
     if type.id == 121: # SeqNote mag/octave additions
       # [0, 1, mag, 0, 1, octave]
@@ -117,3 +232,17 @@ class Module(object):
       # octave: 0-9 (c0-c9)
       self.editmodes = [ 0, 1, 1, 0, 1, 5]
 
+  def connector_coords(self):
+    '''connector_coords() -> (inputs, outputs) lists of connector (x, y)
+
+absolute connector coordinates (horiz about 20 times bigger), cached
+until the module is moved (horiz or vert change).
+'''
+    where = (self.horiz, self.vert)
+    coords = self.__dict__.get('_coords')
+    if coords == None or coords[0] != where:
+      h, v, type = 19*self.horiz, self.vert, self.type
+      coords = self.__dict__['_coords'] = (where,
+        [ (h+t.horiz, v+t.vert) for t in type.inputs ],
+        [ (h+t.horiz, v+t.vert) for t in type.outputs ])
+    return coords[1:]
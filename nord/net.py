@@ -37,34 +37,71 @@ class Net:
     self.output = output
     self.inputs = inputs
 
-class NetList:
+class NetList(object):
+  '''NetList() - the nets of an area.
+
+  nets are kept in a list in creation order, a combined or removed net
+  leaves a None behind so merging and deleting are O(1).  the nets
+  property is a tuple of the nets in that order (a combined net keeps
+  the place of the source net), rebuilt only when read after a change.
+  every connector points directly to its net, when two nets are
+  combined the bigger net object is kept and only the connectors of the
+  smaller one are relabeled, the inputs of the combined net are the
+  source inputs then the dest inputs.
+'''
   def __init__(self):
-    self.nets = []
+    self.slots = [] # nets and None for nets gone, in creation order
+    self.where = {} # net -> index in slots
+    self.cache = () # tuple of the nets, None after a change
+
+  def getnets(self):
+    if self.cache == None:
+      self.cache = tuple([ net for net in self.slots if net ])
+      if len(self.cache) < len(self.slots):
+        self.slots = list(self.cache)
+        self.where = dict([ (net, i) for i, net in enumerate(self.slots) ])
+    return self.cache
+  nets = property(getnets)
+
+  def append(self, net):
+    self.where[net] = len(self.slots)
+    self.slots.append(net)
+    self.cache = None
 
   def copy(self):
     new = NetList()
-    new.nets = self.nets[:]
+    for net in self.nets:
+      new.append(net)
     return new
 
   def combine(self, source, dest):
-    sout, dout = source.net.output, dest.net.output
+    snet, dnet = source.net, dest.net
+    sout, dout = snet.output, dnet.output
     if sout and dout and (sout != dout): # shouldn't happen
-      printf('source %s\n', self.nettos(source.net))
-      printf('dest %s\n', self.nettos(dest.net))
+      printf('source %s\n', self.nettos(snet))
+      printf('dest %s\n', self.nettos(dnet))
       raise NetError(
         'source and dest both have outputs: source=%s:%s dest=%s:%s' % (
         sout.module.type.shortnm, sout.type.name,
         dout.module.type.shortnm, dout.type.name))
 
-    self.nets.remove(dest.net)
-
-    if dout:
-      source.net.output = dout
-      source.net.output.net = source.net
-
-    source.net.inputs += dest.net.inputs
-    for input in dest.net.inputs:
-      input.net = source.net
+    # keep the bigger net, relabel the connectors of the smaller one
+    if len(dnet.inputs) > len(snet.inputs):
+      net, old = dnet, snet
+    else:
+      net, old = snet, dnet
+    net.inputs = snet.inputs + dnet.inputs
+    self.slots[self.where.pop(dnet)] = None
+    index = self.where.pop(snet)
+    self.slots[index] = net
+    self.where[net] = index
+    self.cache = None
+
+    net.output = dout or sout
+    if net.output:
+      net.output.net = net
+    for input in old.inputs:
+      input.net = net
 
   def add(self, source, dest):
     snet, dnet = source.net, dest.net
@@ -105,7 +142,7 @@ class NetList:
         net = Net(source, [dest])
       else:
         net = Net(None, [dest, source])
-      self.nets.append(net)
+      self.append(net)
 
     # update source and dest nets list
     if not source.net:
@@ -118,18 +155,25 @@ class NetList:
       raise NetError('source=%s:%s dest=%s:%s not connected' % (
         source.module.name, source.type.name,
         dest.module.name, dest.type.name))
-    if 0 and not source.net in self.nets:
+    if not source.net in self.where:
       raise NetError('source=%s:%s dest=%s:%s not in netlist' % (
         source.module.name, source.type.name,
         dest.module.name, dest.type.name))
 
-    # remove net from netlist and rebuild two nets
-    net = source.net
+    # remove net from netlist, the caller rebuilds what is left of it
+    self.remove(source.net)
+
+  def remove(self, net):
+    '''remove(net) -> None
+
+  remove net from the netlist and clear the net of all its connectors.
+'''
     if net.output:
       net.output.net = None
     for input in net.inputs:
       input.net = None
-    self.nets.remove(net)
+    self.slots[self.where.pop(net)] = None
+    self.cache = None
 
   def nettos(self, net):
     if not net:
@@ -0,0 +1,230 @@
+#
+# cache.py - binary cache of parsed nm1 patches
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import hashlib, marshal, os, sys
+from array import array
+from nord.file import Cable, Knob, Ctrl, MorphMap, Note
+from nord.nm1.file import NM1Patch, Morph, HeaderV2, HeaderV3
+from nord.nm1.modules import fromname, fromid
+
+# bump when the layout written by dump_patch() changes
+CACHE_FORMAT = 1
+
+# modules whose code decides what a parsed patch looks like
+parser_modules = [
+  'nord.file', 'nord.module', 'nord.net', 'nord.nm1.file',
+  'nord.nm1.modules', 'nord.nm1.cache',
+]
+
+# header members that point back into the parse
+header_skip = [ 'patch', 'defines', 'moduledefs' ]
+header_classes = { 'HeaderV2': HeaderV2, 'HeaderV3': HeaderV3 }
+
+def scalars(obj, skip=[]):
+  '''scalars(obj, skip) -> sorted (name, value) of obj's int/str members'''
+  return sorted([ (name, value) for name, value in obj.__dict__.items()
+      if isinstance(value, (int, long, str)) and not name in skip ])
+
+def conn_ref(conn):
+  return (conn.module.index, conn.direction, conn.index)
+
+def param_ref(patch, param):
+  '''param_ref(patch, param) -> (area, module, param) or (-1, morph, 0)'''
+  if isinstance(param, Morph):
+    return (-1, patch.morphs.index(param), 0)
+  return (param.module.area.index, param.module.index, param.index)
+
+def dump_patch(patch):
+  '''dump_patch(patch) -> string holding NM1Patch patch (see load_patch).'''
+  header = getattr(patch, 'header', None)
+  if header:
+    header = (header.__class__.__name__, scalars(header, header_skip),
+        getattr(header, 'lines', None))
+  data = [ CACHE_FORMAT, header ]
+
+  links = []
+  for area in [ patch.voice, patch.fx ]:
+    modules = []
+    for module in area.modules:
+      modules.append((module.type.id, scalars(module),
+          module.values.tostring(), [ mode.value for mode in module.modes ]))
+      for param in module.params:
+        if param.morph:
+          links.append((param_ref(patch, param),
+              patch.morphs.index(param.morph)))
+    cables = []
+    for cable in area.cables:
+      if cable:
+        cables.append((cable.color, conn_ref(cable.source),
+            conn_ref(cable.dest)))
+      else:
+        cables.append(None)
+    data.append((modules, cables))
+
+  data.append([ (morph.dial, morph.keyassign,
+      [ (param_ref(patch, m.param), m.range) for m in morph.maps ])
+      for morph in patch.morphs ])
+  data.append(links)
+  data.append([ (knob.knob, param_ref(patch, knob.param))
+      for knob in patch.knobs ])
+  data.append([ (ctrl.midicc, param_ref(patch, ctrl.param))
+      for ctrl in patch.ctrls ])
+  notes = [ (note.note, note.attack, note.release) for note in patch.notes ]
+  if patch.lastnote:
+    lastnote = patch.lastnote
+    notes.insert(0, (lastnote.note, lastnote.attack, lastnote.release))
+  data.append((patch.lastnote != None, notes))
+  data.append(patch.textpad)
+  return marshal.dumps(tuple(data))
+
+def make_note(values):
+  note = Note()
+  note.note, note.attack, note.release = values
+  return note
+
+def load_patch(data):
+  '''load_patch(data) -> NM1Patch from a dump_patch() string.'''
+  data = list(marshal.loads(data))
+  if data.pop(0) != CACHE_FORMAT:
+    raise ValueError('unknown nm1 cache format')
+  patch = NM1Patch(fromname)
+
+  header = data.pop(0)
+  if header:
+    classname, members, lines = header
+    header_class = header_classes[classname]
+    header = patch.header = header_class.__new__(header_class)
+    header.__dict__.update(members)
+    header.patch = patch
+    if lines != None:
+      header.lines = lines
+
+  for area in [ patch.voice, patch.fx ]:
+    modules, cables = data.pop(0)
+    for id, members, values, modes in modules:
+      module = area.add_module(fromid(id).shortnm, **dict(members))
+      module.values = array('h')
+      module.values.fromstring(values)
+      for mode, value in zip(module.modes, modes):
+        mode.value = value
+    area.cables = [ None ] * len(cables)
+    for i, cable in enumerate(cables):
+      if not cable:
+        continue
+      c = area.cables[i] = Cable(area)
+      c.color, source, dest = cable
+      c.source, c.dest = find_conn(area, source), find_conn(area, dest)
+      c.source.cables.append(c)
+      c.dest.cables.append(c)
+      area.netlist.add(c.source, c.dest)
+
+  def find_param(ref):
+    area, index, param = ref
+    if area < 0:
+      return patch.morphs[index]
+    return [ patch.fx, patch.voice ][area].find_module(index).params[param]
+
+  for morph, (dial, keyassign, maps) in zip(patch.morphs, data.pop(0)):
+    morph.dial, morph.keyassign = dial, keyassign
+    for ref, range in maps:
+      morphmap = MorphMap()
+      morphmap.param, morphmap.range = find_param(ref), range
+      morph.maps.append(morphmap)
+  for ref, morph in data.pop(0):
+    find_param(ref).morph = patch.morphs[morph]
+
+  patch.knobs = []
+  for value, ref in data.pop(0):
+    knob = Knob()
+    knob.knob, knob.param = value, find_param(ref)
+    knob.param.knob = knob
+    patch.knobs.append(knob)
+  patch.ctrls = []
+  for midicc, ref in data.pop(0):
+    ctrl = Ctrl()
+    ctrl.midicc, ctrl.param = midicc, find_param(ref)
+    ctrl.param.ctrl = ctrl
+    patch.ctrls.append(ctrl)
+
+  haslast, notes = data.pop(0)
+  notes = map(make_note, notes)
+  if haslast:
+    patch.lastnote = notes.pop(0)
+  patch.notes = notes
+  patch.textpad = data.pop(0)
+  return patch
+
+def find_conn(area, ref):
+  index, direction, conn = ref
+  module = area.find_module(index)
+  if direction:
+    return module.outputs[conn]
+  return module.inputs[conn]
+
+class PatchCache(object):
+  '''PatchCache(dirname) - parsed nm1 patches kept in directory dirname.
+
+  an entry is named by the sha1 of the .pch data, CACHE_FORMAT and the
+sources in parser_modules so changing the parser invalidates it.
+PchFile(filename, cache) loads from it and saves to it.
+'''
+  def __init__(self, dirname):
+    self.dirname = dirname
+    self.sources = None
+
+  def key(self, data):
+    if self.sources == None:
+      sha1 = hashlib.sha1(str(CACHE_FORMAT))
+      for name in parser_modules:
+        filename = sys.modules[name].__file__
+        if filename[-4:] in ['.pyc', '.pyo']:
+          filename = filename[:-1]
+        sha1.update(open(filename, 'rb').read())
+      self.sources = sha1.hexdigest()
+    sha1 = hashlib.sha1(self.sources)
+    sha1.update(data)
+    return sha1.hexdigest()
+
+  def path(self, data):
+    return os.path.join(self.dirname, self.key(data) + '.nm1')
+
+  def load(self, data):
+    '''load(data) -> NM1Patch of .pch file data or None if not cached.'''
+    path = self.path(data)
+    if not os.path.exists(path):
+      return None
+    try:
+      return load_patch(open(path, 'rb').read())
+    except (ValueError, EOFError, TypeError):
+      return None
+
+  def save(self, data, patch):
+    '''save(data, patch) - cache patch parsed from .pch file data.'''
+    if not os.path.isdir(self.dirname):
+      os.makedirs(self.dirname)
+    path = self.path(data)
+    # write then rename so parallel jobs never read half an entry
+    tmp = '%s.%d' % (path, os.getpid())
+    out = open(tmp, 'wb')
+    out.write(dump_patch(patch))
+    out.close()
+    os.rename(tmp, path)
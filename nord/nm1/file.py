@@ -19,10 +19,13 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 #
 
-import sys
+import re, sys
+from array import array
+from operator import itemgetter
 
 from nord import printf
 from nord.net import NetList
+from nord.module import NVARIATIONS
 from nord.file import Patch, Note, Cable, Knob, Ctrl, MorphMap
 from nord.nm1.modules import fromname, fromid
 
@@ -34,11 +37,58 @@ class NM1Error(Exception):
   def __str__(self):
     return repr(self.value)
 
+# non numeric fields seen in .pch files
+literal_fields = { 'true': 1, 'false': 0 }
+
+def field_value(f):
+  '''field_value(f) -> int value of .pch field f (number or bool)'''
+  try:
+    return int(f)
+  except ValueError:
+    pass
+  try:
+    return int(f, 0)
+  except ValueError:
+    pass
+  if f.lower() in literal_fields:
+    return literal_fields[f.lower()]
+  raise NM1Error('invalid field "%s"' % f)
+
 def eval_fields(s):
+  '''eval_fields(s) -> list of the int values of the fields of line s'''
+  fields = s.split()
+  try:
+    return map(int, fields)
+  except ValueError:
+    return map(field_value, fields)
+
+def int_rows(lines):
+  '''int_rows(lines) -> (values, start) int values of the fields of lines
+
+\tthe values of lines[i] are values[start[i]:start[i+1]], all lines are
+converted in one go.
+'''
+  fields = ' '.join(lines).split()
   try:
-    return [ int(f) for f in s.split() ]
-  except:
-    return [ eval(f.capitalize()) for f in s.split() ]
+    values = array('i', map(int, fields))
+  except ValueError:
+    values = array('i', map(field_value, fields))
+  start, n = array('i', [0]), 0
+  for l in map(len, map(str.split, lines)):
+    n += l
+    start.append(n)
+  return values, start
+
+def int_table(lines, width, section):
+  '''int_table(lines, width, section) -> int values of the fields of lines
+
+\tevery line must have width fields, the values of lines[i] are
+values[i*width:(i+1)*width].
+'''
+  values, start = int_rows(lines)
+  if start != array('i', xrange(0, width*len(lines)+1, width)):
+    raise NM1Error('%s: %d values per line expected' % (section, width))
+  return values
 
 class Section(object):
   def __init__(self, patch, lines):
@@ -91,8 +141,8 @@ class ModuleDumpV3(Section):
       index, id, horiz, vert = values
       module = area.find_module(index)
       if not module:
-        module = area.add_module(fromid(id).shortnm)
-      module.index, module.horiz, module.vert = index, horiz, vert
+        module = area.add_module(fromid(id).shortnm, index=index)
+      module.horiz, module.vert = horiz, vert
 
 class CurrentNoteDumpV3(Section):
   def parse(self):
@@ -139,10 +189,10 @@ class CableDumpV3(Section):
     area.cables = []
     area.netlist = NetList()
     area.cables = [ None ] * len(self.lines)
+    values = int_table(lines, 7, 'CableDump')
     for i in xrange(len(self.lines)):
-      values = eval_fields(lines[i])
       c = Cable(area)
-      c.color, dmod, dconn, ddir, smod, sconn, sdir = values
+      c.color, dmod, dconn, ddir, smod, sconn, sdir = values[i*7:i*7+7]
       dmodule = area.find_module(dmod)
       smodule = area.find_module(smod)
       if ddir:
@@ -169,25 +219,30 @@ class CableDumpV3(Section):
 
 class ParameterDumpV3(Section):
   def parse(self):
-    lines = self.lines[:]
-    sect = int(lines.pop(0))
+    sect = int(self.lines[0])
     if sect:
       area = self.patch.voice
     else:
       area = self.patch.fx
-    while lines:
-      values = eval_fields(lines.pop(0))
-      index = values.pop(0)
-      typecode = int(values.pop(0))
+    fields, start = int_rows(self.lines[1:])
+    i, nlines = 0, len(start) - 1
+    while i < nlines:
+      values = fields[start[i]:start[i+1]]
+      i += 1
+      index, typecode, count = values[:3]
+      values = values[3:]
       module = area.find_module(index)
       if not module:
         continue
       module.index = index
-      count = values.pop(0)
-      if len(values) < count:
-        values.extend(eval_fields(lines.pop(0)))
-      for i in xrange(min(len(values), len(module.params))):
-        module.params[i].variations = [ values[i] for variations in xrange(9) ]
+      if len(values) < count and i < nlines:
+        values.extend(fields[start[i]:start[i+1]])
+        i += 1
+      # nm1 has one variation, fill all of them from one row
+      row = module.values[:len(module.params)]
+      n = min(len(values), len(row))
+      row[:n] = array('h', values[:n])
+      module.values[:] = row * NVARIATIONS
 
 class CustomDumpV3(Section):
   def parse(self):
@@ -196,15 +251,15 @@ class CustomDumpV3(Section):
       area = self.patch.voice
     else:
       area = self.patch.fx
-    for line in self.lines[1:]:
-      values = eval_fields(line)
-      index = values.pop(0)
+    fields, start = int_rows(self.lines[1:])
+    for j in xrange(len(start) - 1):
+      values = fields[start[j]:start[j+1]]
+      index = values[0]
       module = area.find_module(index)
       if not module:
         raise NM1Error('CustomDump: invalid module index %s' % index)
-      modes = values.pop(0)
       for i, mode in enumerate(module.modes):
-        mode.value = values[i]
+        mode.value = values[i+2]
 
 class MorphMapDumpV3(Section):
   def parse(self):
@@ -212,9 +267,7 @@ class MorphMapDumpV3(Section):
     dials = eval_fields(self.lines[0])
     for i, morph in enumerate(morphs):
       morph.dial = dials[i]
-    values = []
-    for line in self.lines[1:]:
-      values.extend(eval_fields(line))
+    values = int_rows(self.lines[1:])[0]
     for i in xrange(len(values)/5):
       morphmap = MorphMap()
       sect, index, param, morph, morphmap.range = values[i*5:i*5+5]
@@ -237,9 +290,9 @@ class KeyboardAssignmentV3(Section):
 class KnobMapDumpV3(Section):
   def parse(self):
     knobs = self.patch.knobs = [ Knob() for i in xrange(len(self.lines)) ]
-    for i, line in enumerate(self.lines):
-      values = eval_fields(line)
-      sect, index, param, knob = values
+    values = int_table(self.lines, 4, 'KnobMapDump')
+    for i in xrange(len(self.lines)):
+      sect, index, param, knob = values[i*4:i*4+4]
       knobs[i].knob = knob
       if sect == 1:
         knobs[i].param = self.patch.voice.find_module(index).params[param]
@@ -252,8 +305,9 @@ class KnobMapDumpV3(Section):
 class CtrlMapDumpV3(Section):
   def parse(self):
     ctrls = self.patch.ctrls = [ Ctrl() for i in xrange(len(self.lines)) ]
-    for i, line in enumerate(self.lines):
-      sect, index, param, midicc = eval_fields(line)
+    values = int_table(self.lines, 4, 'CtrlMapDump')
+    for i in xrange(len(self.lines)):
+      sect, index, param, midicc = values[i*4:i*4+4]
       if sect == 1:
         ctrls[i].param = self.patch.voice.find_module(index).params[param]
       elif sect == 0:
@@ -288,11 +342,21 @@ class NotesV3(Section):
   def parse(self):
     self.patch.textpad = '\r\n'.join(self.lines)
 
+# numbered V2 keys: p0, im3, ...
+numbered_key = re.compile(r'([a-z]+)(\d+)$')
+
 class V2Define(object):
   def __init__(self, title, lines, **kw):
+    # values of the numbered keys by leader and number
+    numbered = {}
+    for key, value in kw.items():
+      m = numbered_key.match(key)
+      if m:
+        numbered.setdefault(m.group(1), {})[int(m.group(2))] = value
     self.__dict__ = kw # must be done first
     self.title = title
     self.lines = lines
+    self.numbered = numbered
 
 class V2Section(object):
   def __init__(self, patch, defines, moduledefs):
@@ -304,37 +368,36 @@ class V2Section(object):
   def parse(self):
     pass
 
+class V2ModuleDefs(list):
+  '''V2ModuleDefs(moduledefs) - (index, define) pairs of the module
+definitions of a V2 patch sorted by index, with an index to define map.'''
+  def __init__(self, moduledefs):
+    list.__init__(self, moduledefs)
+    self.byindex = {}
+    for moduledef in self:
+      self.byindex.setdefault(moduledef[0], moduledef)
+
+  def find(self, index):
+    '''find(index) -> (index, define) of module index or None'''
+    return self.byindex.get(index)
+
 def getv2moduledefs(defines):
 
   def ismodule(define):
     return define.title[:6] == 'Module' and not 'Dump' in define.title
 
-  def bymoduleindex(a, b):
-    return cmp(int(a[1].title[6:]), int(b[1].title[6:]))
-
   moduledefs = [ (int(define[0][6:]), define[1])
       for define in defines.items() if ismodule(define[1])
   ]
-  moduledefs.sort(bymoduleindex)
-  return moduledefs
+  moduledefs.sort(key=itemgetter(0))
+  return V2ModuleDefs(moduledefs)
 
 def findv2moduledef(defines, index):
-  for define in defines:
-    if define[0] == index:
-      return define
-  return None
+  return defines.find(index)
 
 def getv2params(define, leader):
-  l = len(leader)
-  def isparam(leader, key, l=l):
-    return key[:l] == leader
-
-  def byparamindex(a, b, l=l):
-    return cmp(int(a[l:]), int(b[l:]))
-
-  keys = [ key for key in define.__dict__.keys() if isparam(leader, key) ]
-  keys.sort(byparamindex)
-  return [ [int(key[l:]), getattr(define, key)] for key in keys ]
+  params = define.numbered.get(leader, {})
+  return [ [i, params[i]] for i in sorted(params) ]
 
 MORPH_TYPE = 6
 MAX_MODULES = 127
@@ -351,11 +414,13 @@ class ModulesV2(V2Section):
   def update_module_params(self, moduledef, module):
     params = getv2params(moduledef, 'p')
     lp, lmp = len(params), len(module.params)
+    row = module.values[:lmp]
     for i in xrange(min(lp, lmp)):
       val = int(params[i][1])
       val = max(val, module.params[i].type.type.low)
       val = min(val, module.params[i].type.type.high)
-      module.params[i].variations = [ val for variations in xrange(9) ]
+      row[i] = val
+    module.values[:] = row * NVARIATIONS
 
     if module.type.id == 17: # event seq has bp0 as triggers
       val = int(moduledef.bp0)
@@ -390,9 +455,11 @@ class ModulesV2(V2Section):
       index, moduledef = moduledefs
       if moduledef.type == MORPH_TYPE: # handle this later
         continue
+      if area.find_module(index): # repeated index, the first one wins
+        continue
 
-      module = area.add_module(fromid(moduledef.type).shortnm)
-      module.index, module.name = index, str(moduledef.name)
+      module = area.add_module(fromid(moduledef.type).shortnm, index=index)
+      module.name = str(moduledef.name)
       module.horiz, module.vert = moduledef.col, moduledef.row*2
 
       self.update_module_params(moduledef, module)
@@ -576,6 +643,40 @@ class NM1Patch(Patch):
     self.knobs = []
     self.textpad = ''
 
+# a line starting with "[": the tag ("name]" and anything after it)
+tag_line = re.compile(r'^\[([^\r\n]*)', re.M)
+
+def pch_sections(data, tags=None):
+  '''pch_sections(data, tags=None) -> iterator of (tag, lines)
+
+\tsplit .pch file data into its sections in one pass.  a section starts
+with a "[tag]" line, lines are the (unstripped) lines up to the next
+section without the tag lines.
+\ttags (V3) is a list of (tag, count), only the first count "[tag]"
+lines of each start a section and "[/tag]" ends it.  without tags (V2)
+every line starting with "[" starts a section.
+'''
+  if tags != None:
+    counts = dict(tags)
+  tag = None
+  for m in tag_line.finditer(data):
+    name = m.group(1).rstrip()[:-1]
+    if tags == None:
+      pass
+    elif tag != None and name == '/' + tag:
+      yield tag, data[start:m.start()].splitlines()[1:]
+      tag = None
+      continue
+    elif counts.get(name, 0) > 0:
+      counts[name] -= 1
+    else:
+      continue
+    if tag != None:
+      yield tag, data[start:m.start()].splitlines()[1:]
+    tag, start = name, m.end()
+  if tag != None:
+    yield tag, data[start:].splitlines()[1:]
+
 class PchFile(object):
   v3tags = [
     'Header', 'ModuleDump', 'CurrentNoteDump', 'CableDump', 'ParameterDump',
@@ -587,86 +688,55 @@ class PchFile(object):
     'Modules', 'Header', 'Voices', 'Controllers', 'Morphs', 'Knobs', 'Notes'
   ]
 
-  def __init__(self, filename=None):
+  def __init__(self, filename=None, cache=None):
     self.patch = NM1Patch(fromname)
+    self.cache = cache
     if filename:
       self.read(filename)
 
   def read(self, filename):
     self.filename = filename
-    data = open(filename).read()
+    data = open(filename, 'rb').read()
     v2 = data.find('Nord Modular patch 2.10')
     v3 = data.find('Nord Modular patch 3.0')
     if v2 < 0 and v3 < 0:
       raise NM1Error('%s not valid .pch file' % filename)
-    data = open(filename).read()
-    if data.find('\r\r') > -1:
-      data = data.replace('\r\r','\n\n')
-    data = data.replace('\r','')
-    lines = [ line.strip() for line in data.split('\n') ]
-    lines = filter(lambda s: s != '', lines)
-    if not len(lines):
+    head = data.lstrip()[:40].splitlines()
+    if not len(head):
       raise NM1Error('%s no valid data: not parsing' % filename)
-    if lines[0] != '[Header]':
+    if head[0].strip() != '[Header]':
       printf('added missing [Header]\n')
-      lines.insert(0, '[Header]')
 
     if filename[-4:].lower() != '.pch':
       self.filename += '.pch'
 
+    if self.cache:
+      patch = self.cache.load(data)
+      if patch:
+        self.patch = patch
+        return
+
     if v3 > -1:
       self.readv3(data)
     elif v2 > -1:
       self.readv2(data)
 
-  def findv3sections(self, data):
-    sections = []
-    counts = self.v3counts[:]
-    for tag in self.v3tags:
-      count = counts.pop(0)
-      starttag = '[' + tag + ']'
-      endtag = '[/' + tag + ']'
-      off = start = 0
-      while start > -1 and count > 0:
-        start = data.find(starttag, off)
-        if start < 0:
-          continue
-        end = data.find(endtag, start)
-        if end > -1:
-          end += len(endtag)
-        sections.append([tag, start, end])
-        off = start + len(starttag)
-        count -= 1
-    return sections
-
-  def parsev3data(self, data, sections):
-    l = len(sections)
-    for i, section in enumerate(sections):
-      tag, start, end = section
-      if start < 0:
-        printf('no start tag %s\n', tag)
-        continue
-      if end < 0:
-        if i < l-1:
-          ntag, nstart, nend = sections[i+1]
-          end = nstart
-        else:
-          end = None
-      lines = [ f.strip() for f in data[start:end].splitlines() ]
-      lines = [ line for line in lines if line ]
-      if len(lines) > 2:
-        sect_class = globals()[tag + 'V3']
-        sect = sect_class(self.patch, lines[1:-1])
+    if self.cache:
+      self.cache.save(data, self.patch)
 
   def readv3(self, data):
-    sections = self.findv3sections(data)
-    self.parsev3data(data, sections)
+    # sections are parsed in v3tags order (modules before cables, ...)
+    order = dict([ (tag, i) for i, tag in enumerate(self.v3tags) ])
+    sections = [ (order[tag], i, tag, lines) for i, (tag, lines) in
+        enumerate(pch_sections(data, zip(self.v3tags, self.v3counts))) ]
+    sections.sort()
+    for n, i, tag, lines in sections:
+      lines = [ line for line in map(str.strip, lines) if line ]
+      if len(lines):
+        sect_class = globals()[tag + 'V3']
+        sect = sect_class(self.patch, lines)
 
   def findv2defines(self, data):
-    data = data.replace('\r','')
-    sections = data.split('\n[')
-    sections = [ ('['+section.strip()).splitlines() for section in sections ]
-    sections[0][0] = sections[0][0][1:] # fix [[Header] to [Header]
     # create dictionary of sections with
     # each line in each section set to a parameter in a class object
     # remove ' ' from sections names before creating
@@ -685,19 +755,24 @@ class PchFile(object):
         pass
       return name.lower(), value
 
+    # V2 files are read without any \r (so \r\r\n ends one line), the
+    # lines of a define are its "[tag]" line and the section up to the
+    # last non blank line.
+    data = data.replace('\r', '')
     defines = { }
-    for section in sections:
-      title = section[0][1:-1].replace(' ', '')  # remove [ ]
-      values = [ line.split('=', 1) for line in section[1:] if line.strip() ]
+    for tag, section in pch_sections(data):
+      title = tag.replace(' ', '')
+      values = [ line.split('=', 1) for line in section if line.strip() ]
       values = [ fixparam(v) for v in values if len(v) > 1 ]
       pairs = dict(values)
-      defines[title] = V2Define(title, section, **pairs)
+      lines = ('[%s]\n%s' % (tag, '\n'.join(section))).rstrip().splitlines()
+      defines[title] = V2Define(title, lines, **pairs)
     return defines
 
   def parsev2defines(self, defines):
     moduledefs = getv2moduledefs(defines)
     for tag in self.v2tags:
-      sect = eval('%sV2(self.patch, defines, moduledefs)' % tag)
+      sect = globals()[tag + 'V2'](self.patch, defines, moduledefs)
 
   def readv2(self, data):
     defines = self.findv2defines(data)
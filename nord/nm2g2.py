@@ -21,7 +21,7 @@
 
 import os, sys
 import nord.file
-from nord.g2.file import Pch2File
+from nord.g2.file import pch2_template
 from nord.g2.misc import handle_uprate, midicc_reserved
 from nord.file import MorphMap
 from nord.g2.colors import g2modulecolors, g2cablecolors, g2conncolors
@@ -48,9 +48,9 @@ conn2cablecolors = {
 
 class NM2G2Converter:
   def __init__(self, pchfilename, options, log):
-    self.pch = PchFile(pchfilename)
+    self.pch = PchFile(pchfilename, getattr(options, 'pchcache', None))
     g2oolsdir = os.path.dirname(options.programpath)
-    self.pch2 = Pch2File(os.path.join(g2oolsdir, 'initpatch.pch2'))
+    self.pch2 = pch2_template(os.path.join(g2oolsdir, 'initpatch.pch2'))
     self.nmpatch = self.pch.patch
     self.g2patch = self.pch2.patch
     self.g2patch.voice.keyboard = None
@@ -360,12 +360,14 @@ class NM2G2Converter:
     def movecable(g2area, fromconn, toconn):
       if len(fromconn.cables) == 0:
         return
-      minconn = g2area.removeconnector(fromconn)
+      rewire = g2area.rewire()
+      minconn = g2area.removeconnector(fromconn, rewire)
       if minconn.direction:
         fromconn = minconn
       else:
         fromconn, toconn = toconn, minconn
-      g2area.connect(fromconn, toconn, g2cablecolors.yellow)
+      rewire.connect(fromconn, toconn, g2cablecolors.yellow)
+      rewire.commit()
 
     self.log.info('logic combine:')
 
@@ -0,0 +1,105 @@
+#!/usr/bin/env python2
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import os, sys
+from optparse import OptionParser, make_option
+from glob import glob
+sys.path.append('.')
+from nord import printf
+from nord.g2.library import Library, category_names
+from nord.g2.categories import g2categories
+
+pch2lib_options = [
+  make_option('-c', '--category', action='store',
+      dest='category', default=None,
+      help='Only patches in CATEGORY (bass, lead, ...)'),
+  make_option('-d', '--database', action='store',
+      dest='database', default='pch2lib.db',
+      help='Index database file (default pch2lib.db)'),
+  make_option('-i', '--info', action='store_true',
+      dest='info', default=False,
+      help='Show the indexed fields of each match'),
+  make_option('-m', '--module', action='append',
+      dest='modules', default=[],
+      help='Only patches using module type MODULE (may be repeated)'),
+  make_option('-n', '--name', action='store',
+      dest='name', default=None,
+      help='Only patches with NAME in filename or a module name'),
+  make_option('-r', '--remove-missing', action='store_true',
+      dest='removemissing', default=False,
+      help='Remove files that no longer exist from the index'),
+  make_option('-u', '--update', action='store_true',
+      dest='update', default=False,
+      help='Index the .pch2 files/dirs given as arguments'),
+  make_option('-v', '--min-voices', action='store', type='int',
+      dest='minvoices', default=None,
+      help='Only patches with at least MINVOICES voices'),
+  make_option('-V', '--max-voices', action='store', type='int',
+      dest='maxvoices', default=None,
+      help='Only patches with at most MAXVOICES voices'),
+]
+
+def find_pch2s(args):
+  for arg in args:
+    for path in glob(arg):
+      if os.path.isdir(path):
+        for root, dirnames, filenames in os.walk(path):
+          for name in filenames:
+            if name[-5:].lower() == '.pch2':
+              yield os.path.join(root, name)
+      else:
+        yield path
+
+def main(argv):
+  parser = OptionParser("usage: %prog [options] [-u <pch2-files-or-dirs>]",
+      option_list=pch2lib_options)
+  (options, args) = parser.parse_args(argv[1:])
+  if options.category and not options.category.lower() in category_names:
+    parser.error('unknown category %s (one of %s)' %
+        (options.category, ', '.join(category_names)))
+  library = Library(options.database)
+
+  if options.update:
+    updated = total = 0
+    for filename in find_pch2s(args):
+      total += 1
+      try:
+        if library.update(filename):
+          updated += 1
+      except Exception, e:
+        printf('%s: %s\n', filename, e)
+    printf('%d of %d files indexed\n', updated, total)
+  if options.removemissing:
+    printf('%d missing files removed\n', library.remove_missing())
+
+  if not options.update and not options.removemissing:
+    for filename in library.query(options.category, options.modules,
+        options.minvoices, options.maxvoices, options.name):
+      printf('%s\n', filename)
+      if options.info:
+        info = library.describe(filename)
+        printf('  category: %s voices: %d modules: %d cables: %d\n',
+            g2categories[info['category']], info['voices'],
+            info['modules'], info['cables'])
+  library.close()
+
+if __name__ == '__main__':
+  main(sys.argv)
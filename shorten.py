@@ -10,7 +10,7 @@ while len(sys.argv):
   if filename[-4:].lower() == 'prf2':
     prf2 = Prf2File(filename)
     for p in range(4):
-      patch = prf2.performance.patches[p]
+      patch = prf2.performance.slots[p].patch
       patch.voice.shorten_cables()
       patch.fx.shorten_cables()
     prf2.write(filename)
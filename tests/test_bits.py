@@ -0,0 +1,204 @@
+#
+# test_bits.py - tests of the g2 bit stream and bit field records
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import imp, os, random, subprocess, sys, unittest
+from array import array
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+topdir = os.path.dirname(testdir)
+sys.path.insert(0, topdir)
+
+from nord.g2.bits import BitLayout
+
+def pure_bits():
+  '''pure_bits() -> nord.g2.bits without the compiled nord.g2._bits.'''
+  saved = sys.modules.get('nord.g2._bits')
+  sys.modules['nord.g2._bits'] = None # makes the import fail
+  try:
+    return imp.load_source('pure_bits',
+        os.path.join(topdir, 'nord', 'g2', 'bits.py'))
+  finally:
+    if saved:
+      sys.modules['nord.g2._bits'] = saved
+    else:
+      del sys.modules['nord.g2._bits']
+
+pure = pure_bits()
+streams = [ pure.BitStream ]
+try:
+  from nord.g2._bits import BitStream
+  streams.append(BitStream)
+except ImportError:
+  pass
+
+def random_record(rand, maxbits=8):
+  '''random_record(rand) -> (nbitsa, values) of up to 12 fields.'''
+  nbitsa = [ rand.randint(1, maxbits) for i in xrange(rand.randint(1, 12)) ]
+  return nbitsa, [ rand.randrange(1 << n) for n in nbitsa ]
+
+class Record(object):
+  pass
+
+class SlotsRecord(object):
+  __slots__ = ( 'a', 'b', 'c', 'd' )
+
+fields = [ ['a', 3], ['b', 8], ['c', 1], ['d', 5] ]
+
+class BitStreamTest(unittest.TestCase):
+  def test_write_bitsa_equal_write_bits(self):
+    rand = random.Random(1)
+    for stream in streams:
+      for round in xrange(200):
+        start = rand.randrange(16)
+        nbitsa, values = random_record(rand)
+        a, b = bytearray(16), bytearray(16)
+        sa, sb = stream(a, start), stream(b, start)
+        for nbits, value in zip(nbitsa, values):
+          sa.write_bits(nbits, value)
+        sb.write_bitsa(nbitsa, values)
+        self.assertEqual(a, b, (stream, start, nbitsa))
+        self.assertEqual(sa.tell_bit(), sb.tell_bit())
+        self.assertEqual(sb.tell_bit(), start + sum(nbitsa))
+
+  def test_read_bitsa_equal_read_bits(self):
+    rand = random.Random(2)
+    for stream in streams:
+      for round in xrange(200):
+        start = rand.randrange(16)
+        nbitsa, values = random_record(rand)
+        data = bytearray([ rand.randrange(256) for i in xrange(16) ])
+        sa, sb = stream(data, start), stream(data, start)
+        self.assertEqual([ sa.read_bits(n) for n in nbitsa ],
+            list(sb.read_bitsa(nbitsa)), (stream, start, nbitsa))
+        self.assertEqual(sa.tell_bit(), sb.tell_bit())
+
+  def test_round_trip(self):
+    rand = random.Random(3)
+    for stream in streams:
+      for round in xrange(200):
+        start = rand.randrange(16)
+        nbitsa, values = random_record(rand)
+        data = bytearray(16)
+        stream(data, start).write_bitsa(nbitsa, values)
+        self.assertEqual(list(stream(data, start).read_bitsa(nbitsa)), values)
+        # a memoryview of the buffer reads the same
+        self.assertEqual(
+            list(stream(memoryview(data), start).read_bitsa(nbitsa)), values)
+
+  def test_signed(self):
+    for stream in streams:
+      data = bytearray(4)
+      stream(data).write_bits(8, -3)
+      self.assertEqual(stream(data).read_bits(8, 1), -3)
+      self.assertEqual(stream(data).read_bits(8), 253)
+
+class BitLayoutTest(unittest.TestCase):
+  def test_read_write(self):
+    layout = BitLayout(fields)
+    self.assertEqual(layout.names, ('a', 'b', 'c', 'd'))
+    self.assertEqual(layout.nbitsa, (3, 8, 1, 5))
+    self.assertEqual(layout.nbits, 17)
+    for stream in streams:
+      data = bytearray(8)
+      s = stream(data, 5)
+      layout.write(s, [5, 200, 1, 17])
+      self.assertEqual(s.tell_bit(), 5 + layout.nbits)
+      s = stream(data, 5)
+      self.assertEqual(layout.read(s), (5, 200, 1, 17))
+      s = stream(data, 5)
+      self.assertEqual([ s.read_bits(n) for n in layout.nbitsa ],
+          [5, 200, 1, 17])
+
+  def test_attrs(self):
+    layout = BitLayout(fields)
+    for stream in streams:
+      for cls in [ Record, SlotsRecord ]:
+        obj = cls()
+        obj.a, obj.b, obj.c, obj.d = 2, 99, 0, 31
+        a, b = bytearray(8), bytearray(8)
+        layout.write_attrs(stream(a, 3), obj)
+        layout.write(stream(b, 3), [2, 99, 0, 31])
+        self.assertEqual(a, b)
+        new = layout.read_attrs(stream(a, 3), cls())
+        self.assertEqual((new.a, new.b, new.c, new.d), (2, 99, 0, 31))
+
+  def test_one_field(self):
+    layout = BitLayout([['a', 7]])
+    obj = Record()
+    obj.a = 100
+    for stream in streams:
+      data = bytearray(4)
+      layout.write_attrs(stream(data), obj)
+      self.assertEqual(layout.read(stream(data)), (100,))
+
+class BitsaTest(unittest.TestCase):
+  '''getbitsa/setbitsa against getbits/setbits on each buffer type.'''
+  buffers = [ bytearray, lambda data: memoryview(bytearray(data)),
+      lambda data: array('B', data) ]
+
+  def test_getbitsa(self):
+    rand = random.Random(4)
+    for make in self.buffers:
+      for round in xrange(200):
+        bit = rand.randrange(24)
+        nbitsa, values = random_record(rand, 16)
+        data = make([ rand.randrange(256) for i in xrange(32) ])
+        expected, pos = [], bit
+        for nbits in nbitsa:
+          pos, value = pure.getbits(pos, nbits, data)
+          expected.append(value)
+        self.assertEqual(pure.getbitsa(bit, nbitsa, data), (pos, expected))
+
+  def test_setbitsa(self):
+    rand = random.Random(5)
+    for make in self.buffers:
+      for round in xrange(200):
+        bit = rand.randrange(24)
+        nbitsa, values = random_record(rand, 16)
+        init = [ rand.randrange(256) for i in xrange(32) ]
+        a, b = make(init), make(init)
+        pos = bit
+        for nbits, value in zip(nbitsa, values):
+          pos = pure.setbits(pos, nbits, a, value)
+        self.assertEqual(pure.setbitsa(bit, nbitsa, b, values), pos)
+        self.assertEqual(bytearray(a), bytearray(b), (bit, nbitsa))
+        self.assertEqual(pure.getbitsa(bit, nbitsa, b)[1], values)
+
+class PurePatchTest(unittest.TestCase):
+  def test_pure_formats_equal(self):
+    '''a .pch2 read and formatted without nord.g2._bits is the same.'''
+    script = '''
+import sys
+sys.modules['nord.g2._bits'] = None
+sys.path.insert(0, %r)
+from nord.g2.file import Pch2File
+sys.stdout.write(Pch2File(%r).format_file().tobytes())
+'''
+    from nord.g2.file import Pch2File
+    for name in [ 'dx7.pch2', 'nord/g2/temp.pch2' ]:
+      filename = os.path.join(topdir, name)
+      out = subprocess.check_output([ sys.executable, '-c',
+          script % (topdir, filename) ])
+      self.assertEqual(out, Pch2File(filename).format_file().tobytes(), name)
+
+if __name__ == '__main__':
+  unittest.main()
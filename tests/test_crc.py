@@ -0,0 +1,72 @@
+#
+# test_crc.py - tests of the nord g2 crc
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import os, sys, unittest
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+topdir = os.path.dirname(testdir)
+sys.path.insert(0, topdir)
+
+from nord.g2.crc import Crc, crc, crc_, crc16
+
+def crc_bytewise(s):
+  c = 0
+  for ch in s:
+    c = crc16(ord(ch), c)
+  return c & 0xffff
+
+class CrcTest(unittest.TestCase):
+  def setUp(self):
+    self.data = open(os.path.join(topdir, 'dx7.pch2'), 'rb').read()
+
+  def test_engines_agree(self):
+    for s in [ '', 'a', '123456789', self.data[:7], self.data ]:
+      expected = crc_bytewise(s)
+      self.assertEqual(crc(s), expected)
+      self.assertEqual(crc_(s), expected)
+      self.assertEqual(crc_(bytearray(s)), expected)
+      self.assertEqual(crc(memoryview(bytearray(s))), expected)
+
+  def test_known_value(self):
+    # crc-16/xmodem check value
+    self.assertEqual(crc('123456789'), 0x31c3)
+
+  def test_incremental_equals_one_shot(self):
+    whole = Crc(self.data)
+    for size in [ 1, 3, 4, 5, 1000 ]:
+      c = Crc()
+      for i in xrange(0, len(self.data), size):
+        c.update(self.data[i:i+size])
+      self.assertEqual(c.crc, whole.crc)
+      self.assertEqual(c.digest(), whole.digest())
+    self.assertEqual(whole.crc, crc(self.data))
+    self.assertEqual(whole.digest(),
+        chr(whole.crc >> 8) + chr(whole.crc & 0xff))
+    self.assertEqual(whole.hexdigest(), '%04x' % crc(self.data))
+
+  def test_continue(self):
+    a, b = self.data[:100], self.data[100:]
+    self.assertEqual(crc(b, crc(a)), crc(self.data))
+    self.assertEqual(crc_(b, crc_(a)), crc(self.data))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,82 @@
+#
+# test_graph.py - tests of the integer graph snapshot of patch areas
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import os, random, sys, unittest
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+topdir = os.path.dirname(testdir)
+sys.path.insert(0, topdir)
+
+from nord.g2.file import Pch2File
+from test_net import new_area, random_cables, components
+
+def patch_areas():
+  patch = Pch2File(os.path.join(topdir, 'dx7.pch2')).patch
+  area = new_area()
+  # oscillators driving some of the switches
+  for i, module in enumerate(area.modules[:3]):
+    osc = area.add_module('OscB', horiz=i, vert=20)
+    area.connect(osc.outputs.Out, module.inputs[0], 0)
+  random_cables(area, random.Random(5), 60)
+  return [ patch.voice, patch.fx, area ]
+
+class AreaGraphTest(unittest.TestCase):
+  def test_snapshot(self):
+    for area in patch_areas():
+      graph = area.graph()
+      self.assertEqual(graph.modules, tuple(area.modules))
+      for m, module in enumerate(graph.modules):
+        conns = graph.connectors[graph.module_conns[m]:graph.module_conns[m+1]]
+        self.assertEqual(list(conns), list(module.inputs + module.outputs))
+        for conn in conns:
+          self.assertEqual(graph.conn_module[graph.conn_id(conn)], m)
+      for n, net in enumerate(graph.nets):
+        self.assertEqual([ graph.connectors[c] for c in graph.net_inputs_of(n) ],
+            net.inputs)
+        if net.output:
+          self.assertTrue(graph.connectors[graph.net_output[n]] is net.output)
+        else:
+          self.assertEqual(graph.net_output[n], -1)
+      for conn in graph.connectors:
+        neighbors = [ graph.connectors[c]
+            for c in graph.neighbors(graph.conn_id(conn)) ]
+        others = [ [ c.source, c.dest ][c.source is conn] for c in conn.cables ]
+        self.assertEqual(sorted(map(id, neighbors)), sorted(map(id, others)))
+
+  def test_read_only(self):
+    graph = patch_areas()[0].graph()
+    for name in [ 'modules', 'connectors', 'module_conns', 'conn_rate',
+        'conn_net', 'net_output', 'net_start', 'net_inputs', 'cables',
+        'adj_start', 'adj', 'adj_cable' ]:
+      self.assertTrue(isinstance(getattr(graph, name), tuple), name)
+    self.assertTrue(isinstance(graph.net_inputs_of(0), tuple))
+
+  def test_components(self):
+    for area in patch_areas():
+      graph = area.graph()
+      comp = graph.components()
+      for conns in components(area):
+        ids = [ graph.conn_id(c) for c in conns ]
+        self.assertEqual(set([ comp[i] for i in ids ]), set([ min(ids) ]))
+
+if __name__ == '__main__':
+  unittest.main()
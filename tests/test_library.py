@@ -0,0 +1,123 @@
+#
+# test_library.py - tests of the .pch2 library index
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import os, shutil, sqlite3, subprocess, sys, tempfile, unittest
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+topdir = os.path.dirname(testdir)
+sys.path.insert(0, topdir)
+
+from nord.g2.library import Library
+
+class LibraryTest(unittest.TestCase):
+  def setUp(self):
+    self.dirname = tempfile.mkdtemp()
+    self.files = []
+    for name in [ 'dx7.pch2', 'nord/g2/temp.pch2', 'initpatch.pch2' ]:
+      shutil.copy(os.path.join(topdir, name), self.dirname)
+      self.files.append(os.path.join(self.dirname, os.path.basename(name)))
+    self.dx7, self.temp, self.init = self.files
+    self.library = Library(os.path.join(self.dirname, 'lib.db'))
+    for filename in self.files:
+      self.assertTrue(self.library.update(filename))
+
+  def tearDown(self):
+    self.library.close()
+    shutil.rmtree(self.dirname)
+
+  def test_unchanged_not_reindexed(self):
+    for filename in self.files:
+      self.assertFalse(self.library.update(filename))
+    # a touched file keeps its sha1, only the mtime is updated
+    st = os.stat(self.dx7)
+    os.utime(self.dx7, (st.st_atime, st.st_mtime + 10))
+    self.assertFalse(self.library.update(self.dx7))
+    self.assertFalse(self.library.update(self.dx7))
+
+  def test_changed_reindexed(self):
+    shutil.copy(self.temp, self.dx7)
+    st = os.stat(self.dx7)
+    os.utime(self.dx7, (st.st_atime, st.st_mtime + 10))
+    self.assertTrue(self.library.update(self.dx7))
+    self.assertEqual(self.library.describe(self.dx7)['modules'],
+        self.library.describe(self.temp)['modules'])
+
+  def test_same_size_and_crc_reindexed(self):
+    # the stored crc only covers the binary data, not the text header
+    data = open(self.dx7, 'rb').read()
+    open(self.dx7, 'wb').write(data.replace('BUILD 266', 'BUILD 267'))
+    st = os.stat(self.dx7)
+    os.utime(self.dx7, (st.st_atime, st.st_mtime + 10))
+    self.assertEqual(len(open(self.dx7, 'rb').read()), len(data))
+    self.assertTrue(self.library.update(self.dx7))
+    self.assertFalse(self.library.update(self.dx7))
+
+  def test_old_index_rebuilt(self):
+    self.library.close()
+    dbname = os.path.join(self.dirname, 'old.db')
+    db = sqlite3.connect(dbname)
+    db.execute('create table patches (id integer primary key, '
+        'filename text unique, mtime real, size integer, crc integer)')
+    db.execute('create table modules (patch integer)')
+    db.commit()
+    db.close()
+    self.library = Library(dbname)
+    self.assertTrue(self.library.update(self.dx7))
+    self.assertFalse(self.library.update(self.dx7))
+
+  def test_describe(self):
+    info = self.library.describe(self.dx7)
+    self.assertEqual((info['voices'], info['modules'], info['cables']),
+        (23, 44, 102))
+    self.assertEqual(self.library.describe(self.init)['modules'], 0)
+    self.assertEqual(self.library.describe('nosuchfile.pch2'), None)
+
+  def test_query(self):
+    query = self.library.query
+    self.assertEqual(query(), sorted(self.files))
+    self.assertEqual(query(category='synth'), [ self.dx7 ])
+    self.assertEqual(query(category='Sequencer'), [ self.temp ])
+    self.assertEqual(query(modules=['DXRouter']), [ self.dx7 ])
+    self.assertEqual(query(modules=['Glide', 'ClkGen']), [ self.temp ])
+    self.assertEqual(query(modules=['Glide'], category='bass'), [])
+    self.assertEqual(query(minvoices=2), [ self.dx7 ])
+    self.assertEqual(query(maxvoices=1), sorted([ self.temp, self.init ]))
+    self.assertEqual(query(name='initpatch'), [ self.init ])
+
+  def test_unknown_category(self):
+    self.assertRaises(ValueError, self.library.query, category='nosuch')
+    pch2lib = os.path.join(topdir, 'pch2lib.py')
+    proc = subprocess.Popen([ sys.executable, pch2lib, '-d',
+        os.path.join(self.dirname, 'lib.db'), '-c', 'nosuch' ],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    self.assertEqual(proc.returncode, 2)
+    self.assertTrue('unknown category nosuch' in err)
+    self.assertFalse('Traceback' in err)
+
+  def test_remove_missing(self):
+    os.remove(self.temp)
+    self.assertEqual(self.library.remove_missing(), 1)
+    self.assertEqual(self.library.query(), sorted([ self.dx7, self.init ]))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,173 @@
+#
+# test_module.py - tests of modules and the module index of areas
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import os, sys, unittest
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+topdir = os.path.dirname(testdir)
+sys.path.insert(0, topdir)
+
+from nord.file import Patch, MAX_MODULES
+from nord.module import NVARIATIONS
+from nord.g2.modules import fromname
+
+class ModuleIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.area = Patch(fromname).voice
+
+  def test_lowest_free_index(self):
+    area = self.area
+    modules = [ area.add_module('LevAmp') for i in xrange(5) ]
+    self.assertEqual([ m.index for m in modules ], [1, 2, 3, 4, 5])
+    area.del_module(modules[3])
+    area.del_module(modules[1])
+    self.assertEqual(area.add_module('LevAmp').index, 2)
+    self.assertEqual(area.add_module('LevAmp').index, 4)
+    self.assertEqual(area.add_module('LevAmp').index, 6)
+    for m in area.modules:
+      self.assertTrue(area.find_module(m.index) is m)
+    self.assertEqual(area.find_module(7), None)
+
+  def test_explicit_index(self):
+    area = self.area
+    m = area.add_module('LevAmp', index=2)
+    self.assertEqual(m.index, 2)
+    self.assertTrue(area.find_module(2) is m)
+    # the default skips indexes already taken explicitly
+    self.assertEqual([ area.add_module('LevAmp').index for i in xrange(3) ],
+        [1, 3, 4])
+    area.del_module(m)
+    self.assertEqual(area.add_module('LevAmp').index, 2)
+
+  def test_bad_index(self):
+    area = self.area
+    area.add_module('LevAmp', index=5)
+    nmodules = len(area.modules)
+    for index in [ 5, 0, -1, MAX_MODULES + 1 ]:
+      self.assertRaises(Exception, area.add_module, 'LevAmp', index=index)
+    self.assertEqual(len(area.modules), nmodules)
+    self.assertEqual(area.find_module(5).index, 5)
+    self.assertEqual(area.add_module('LevAmp', index=MAX_MODULES).index,
+        MAX_MODULES)
+
+  def test_full(self):
+    area = self.area
+    for i in xrange(MAX_MODULES):
+      area.add_module('LevAmp')
+    self.assertEqual(sorted(area.modules_by_index),
+        range(1, MAX_MODULES + 1))
+    self.assertRaises(Exception, area.add_module, 'LevAmp')
+
+  def test_index_modules(self):
+    area = self.area
+    a = area.add_module('LevAmp', index=3)
+    b = area.add_module('LevAmp', index=4)
+    c = area.add_module('LevAmp', index=5)
+    c.index = 3 # as a broken file may have it
+    area.index_modules()
+    self.assertTrue(area.find_module(3) is a)
+    self.assertTrue(area.find_module(4) is b)
+    self.assertEqual(area.find_module(5), None)
+    self.assertEqual(area.add_module('LevAmp').index, 1)
+
+class ArrayTest(unittest.TestCase):
+  def setUp(self):
+    self.module = Patch(fromname).voice.add_module('LfoC')
+
+  def test_names(self):
+    module = self.module
+    for array in [ module.inputs, module.outputs, module.params,
+        module.modes ]:
+      for item in array:
+        self.assertTrue(getattr(array, item.type.name) is item)
+
+  def test_assign_rebinds_name(self):
+    # as with the old per array names, assigning a name rebinds it on that
+    # array only, the items and other modules are left alone
+    module = self.module
+    params, modes = module.params, module.modes
+    rate, waveform = params.Rate, modes.Waveform
+    values = list(module.values)
+    params.Rate = 3
+    modes.Waveform = 1
+    self.assertEqual((params.Rate, modes.Waveform), (3, 1))
+    self.assertTrue(params[rate.index] is rate)
+    self.assertTrue(modes[waveform.index] is waveform)
+    self.assertEqual(list(module.values), values)
+    self.assertEqual(waveform.value, waveform.type.type.default)
+    other = module.area.add_module('LfoC')
+    self.assertTrue(other.params.Rate is other.params[rate.index])
+    module.outputs.NoSuch = 0
+    self.assertEqual(module.outputs.NoSuch, 0)
+
+class VariationsTest(unittest.TestCase):
+  def setUp(self):
+    module = Patch(fromname).voice.add_module('LfoC')
+    self.rate, self.range = module.params.Rate, module.params.Range
+    self.rate.variations = range(10, 10 + NVARIATIONS)
+    self.variations = self.rate.variations
+
+  def test_list_like(self):
+    variations = self.variations
+    expected = range(10, 10 + NVARIATIONS)
+    self.assertEqual(len(variations), NVARIATIONS)
+    self.assertEqual(list(variations), expected)
+    self.assertEqual(variations, expected)
+    self.assertFalse(variations != expected)
+    self.assertEqual(repr(variations), repr(expected))
+    self.assertEqual(variations[0], 10)
+    self.assertEqual(variations[-1], expected[-1])
+    self.assertEqual(variations[2:5], expected[2:5])
+    self.assertEqual(variations[::-1], expected[::-1])
+    self.assertRaises(IndexError, variations.__getitem__, NVARIATIONS)
+    self.assertRaises(IndexError, variations.__getitem__, -NVARIATIONS - 1)
+    self.assertTrue(12 in variations)
+    self.assertFalse(9 in variations)
+    self.assertEqual(variations.index(12), 2)
+    self.assertRaises(ValueError, variations.index, 9)
+    self.assertEqual(variations.count(12), 1)
+    self.assertEqual(variations.count(9), 0)
+
+  def test_set(self):
+    variations = self.variations
+    variations[0] = 5
+    variations[-1] = 6
+    variations[1:3] = [7, 7]
+    self.assertEqual(list(self.rate.variations),
+        [5, 7, 7] + range(13, 9 + NVARIATIONS) + [6])
+    self.assertEqual(variations.count(7), 2)
+    # the other params of the module are not touched
+    self.assertEqual(list(self.range.variations),
+        [self.range.type.type.default] * NVARIATIONS)
+    self.assertRaises(ValueError, variations.__setitem__, slice(0, 2), [1])
+
+  def test_range(self):
+    variations = self.variations
+    variations[0] = -32768
+    variations[1] = 32767
+    self.assertEqual(variations[:2], [-32768, 32767])
+    self.assertRaises(OverflowError, variations.__setitem__, 0, 32768)
+    self.assertRaises(OverflowError, setattr, self.rate, 'variations',
+        [70000] * NVARIATIONS)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,343 @@
+#
+# test_net.py - tests of cable nets of patch areas
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import os, random, sys, unittest
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+topdir = os.path.dirname(testdir)
+sys.path.insert(0, topdir)
+
+from nord.g2.file import Pch2File
+from nord.g2.modules import fromname
+from nord.file import Patch
+
+def new_area(nmodules=12):
+  '''new_area(nmodules) -> voice area of Sw8-1 modules (8 in, 2 out).'''
+  area = Patch(fromname).voice
+  for i in xrange(nmodules):
+    area.add_module('Sw8-1', horiz=i % 4, vert=(i / 4) * 4)
+  return area
+
+def components(area):
+  '''components(area) -> sets of the connectors cables join.'''
+  comp = {}
+  for cable in area.cables:
+    s, d = cable.source, cable.dest
+    a, b = comp.setdefault(s, set([s])), comp.setdefault(d, set([d]))
+    if a is not b:
+      a |= b
+      for conn in b:
+        comp[conn] = a
+  return dict([ (id(c), c) for c in comp.values() ]).values()
+
+def random_cables(area, rand, ncables):
+  '''random_cables(area, rand, ncables) - connect ncables random cables,
+  never joining two outputs into one net.'''
+  inputs = [ i for m in area.modules for i in m.inputs ]
+  outputs = [ o for m in area.modules for o in m.outputs ]
+  for n in xrange(ncables):
+    dest = rand.choice(inputs)
+    if rand.random() < 0.4:
+      source = rand.choice(outputs)
+    else:
+      source = rand.choice(inputs)
+    if source is dest or set(source.cables) & set(dest.cables):
+      continue
+    if source.net and dest.net and source.net is dest.net:
+      continue
+    nets = [ c.net for c in [ source, dest ] if c.net ]
+    outs = set([ net.output for net in nets if net.output ])
+    if source.direction:
+      outs.add(source)
+    if len(outs) > 1:
+      continue
+    area.connect(source, dest, 0)
+
+class NetTest(unittest.TestCase):
+  def check_nets(self, area):
+    '''the nets are exactly the cable connected components.'''
+    nets = area.netlist.nets
+    self.assertEqual(len(set(nets)), len(nets))
+    seen = set()
+    for net in nets:
+      conns = net.inputs + [ c for c in [net.output] if c ]
+      for conn in conns:
+        self.assertTrue(conn.net is net)
+        self.assertFalse(conn in seen)
+        seen.add(conn)
+      if net.output:
+        self.assertEqual(net.output.direction, 1)
+      for input in net.inputs:
+        self.assertEqual(input.direction, 0)
+    comps = components(area)
+    self.assertEqual(len(comps), len(nets))
+    for comp in comps:
+      net = list(comp)[0].net
+      self.assertTrue(net in nets)
+      conns = net.inputs + [ c for c in [net.output] if c ]
+      self.assertEqual(comp, set(conns))
+    for module in area.modules:
+      for conn in module.inputs + module.outputs:
+        if not conn.cables:
+          self.assertEqual(conn.net, None)
+
+class NetListTest(NetTest):
+  def test_nets_read_is_cached(self):
+    area = new_area(2)
+    a, b = area.modules
+    area.connect(a.outputs[0], b.inputs[0], 0)
+    nets = area.netlist.nets
+    self.assertTrue(area.netlist.nets is nets)
+    self.assertTrue(isinstance(nets, tuple))
+    area.connect(a.outputs[1], b.inputs[1], 0)
+    self.assertEqual(len(area.netlist.nets), 2)
+    self.assertEqual(len(nets), 1)
+
+  def test_combine(self):
+    area = new_area(3)
+    a, b, c = area.modules
+    area.connect(a.outputs[0], b.inputs[0], 0)        # net 0
+    area.connect(a.outputs[1], b.inputs[1], 0)        # net 1
+    area.connect(b.inputs[2], c.inputs[0], 0)         # net 2
+    area.connect(c.inputs[0], c.inputs[1], 0)
+    first, second, third = area.netlist.nets
+    # dest (third, 3 inputs) is bigger than source (second, 1 input):
+    # third is kept but the inputs stay in source then dest order
+    inputs = second.inputs + third.inputs
+    area.connect(b.inputs[1], c.inputs[1], 0)
+    nets = area.netlist.nets
+    self.assertEqual(len(nets), 2)
+    self.assertTrue(nets[0] is first)
+    # the combined net takes the place of the source net
+    self.assertTrue(nets[1] is third)
+    self.assertEqual(third.output, a.outputs[1])
+    self.assertEqual(third.inputs, inputs)
+    self.assertEqual(third.inputs[0], b.inputs[1])
+    self.check_nets(area)
+
+    # same size, source then dest
+    d = area.add_module('Sw8-1')
+    area.connect(d.inputs[0], d.inputs[1], 0)
+    area.connect(d.inputs[2], d.inputs[3], 0)
+    source, dest = d.inputs[1].net, d.inputs[2].net
+    inputs = source.inputs + dest.inputs
+    area.connect(d.inputs[1], d.inputs[2], 0)
+    self.assertTrue(d.inputs[0].net is source)
+    self.assertEqual(source.inputs, inputs)
+    self.assertTrue(area.netlist.nets[-1] is source)
+    self.check_nets(area)
+
+  def test_remove(self):
+    area = new_area(2)
+    a, b = area.modules
+    area.connect(a.outputs[0], b.inputs[0], 0)
+    area.connect(a.outputs[1], b.inputs[1], 0)
+    net = a.outputs[0].net
+    area.netlist.remove(net)
+    self.assertEqual(area.netlist.nets, (a.outputs[1].net,))
+    self.assertEqual((a.outputs[0].net, b.inputs[0].net), (None, None))
+    area.connect(b.inputs[2], b.inputs[3], 0)
+    self.assertEqual(len(area.netlist.nets), 2)
+    self.assertTrue(area.netlist.nets[0] is a.outputs[1].net)
+
+  def test_random_connect_disconnect(self):
+    rand = random.Random(1)
+    for round in xrange(20):
+      area = new_area()
+      random_cables(area, rand, 60)
+      self.check_nets(area)
+      while area.cables:
+        area.disconnect(rand.choice(area.cables))
+        self.check_nets(area)
+      self.assertEqual(area.netlist.nets, ())
+
+  def test_parsed_patch(self):
+    patch = Pch2File(os.path.join(topdir, 'dx7.pch2')).patch
+    self.check_nets(patch.voice)
+    self.check_nets(patch.fx)
+
+def net_conns(net):
+  return frozenset(net.inputs + [ c for c in [net.output] if c ])
+
+class ShortenTest(NetTest):
+  def mst_length(self, area, conns):
+    '''mst_length(area, conns) -> minimum spanning tree length (Kruskal).'''
+    edges = sorted([ (area.connection_length(a, b), i, j)
+        for i, a in enumerate(conns) for j, b in enumerate(conns) if i < j ])
+    group = range(len(conns))
+    def find(i):
+      while group[i] != i:
+        i = group[i]
+      return i
+    total = 0
+    for length, i, j in edges:
+      a, b = find(i), find(j)
+      if a != b:
+        group[a] = b
+        total += length
+    return total
+
+  def test_spanning_tree(self):
+    area = new_area()
+    rand = random.Random(2)
+    conns = [ c for m in area.modules for c in m.inputs + m.outputs ]
+    for n in [ 1, 2, 3, 7, 20 ]:
+      sample = rand.sample(conns, n)
+      pairs = area.spanning_tree(sample)
+      self.assertEqual(len(pairs), n - 1)
+      connected = set([ sample[0] ])
+      for fromconn, toconn in pairs:
+        self.assertTrue(fromconn in connected)
+        self.assertFalse(toconn in connected)
+        connected.add(toconn)
+      self.assertEqual(connected, set(sample))
+      length = sum([ area.connection_length(a, b) for a, b in pairs ])
+      self.assertEqual(length, self.mst_length(area, sample))
+
+  def test_shorten_cables(self):
+    patch = Pch2File(os.path.join(topdir, 'dx7.pch2')).patch
+    for area in [ patch.voice, patch.fx ]:
+      nets = set([ (net_conns(net), net.output)
+          for net in area.netlist.nets ])
+      length = sum(map(area.cable_length, area.cables))
+      area.shorten_cables()
+      self.check_nets(area)
+      self.assertEqual(set([ (net_conns(net), net.output)
+          for net in area.netlist.nets ]), nets)
+      self.assertTrue(sum(map(area.cable_length, area.cables)) <= length)
+      for net in area.netlist.nets:
+        cables = set([ c for conn in net_conns(net) for c in conn.cables ])
+        self.assertEqual(len(cables), len(net_conns(net)) - 1)
+
+class RemoveConnectorTest(NetTest):
+  def test_coords_follow_moves(self):
+    area = new_area(1)
+    module = area.modules[0]
+    conn = module.inputs[3]
+    self.assertEqual(area.connector_coords([conn]),
+        ([19*module.horiz+conn.type.horiz], [module.vert+conn.type.vert]))
+    module.horiz, module.vert = 3, 7
+    self.assertEqual(area.connector_coords([conn]),
+        ([57+conn.type.horiz], [7+conn.type.vert]))
+
+  def test_closest_is_kept(self):
+    area = new_area(4)
+    a, b, c, d = area.modules
+    connector = b.inputs[0]
+    area.connect(a.outputs[0], connector, 0)
+    area.connect(connector, c.inputs[0], 0)
+    area.connect(connector, d.inputs[5], 0)
+    others = [ a.outputs[0], c.inputs[0], d.inputs[5] ]
+    closest = min(others, key=lambda o: area.connection_length(connector, o))
+    self.assertTrue(area.removeconnector(connector) is closest)
+    self.assertEqual(connector.cables, [])
+    self.assertEqual(connector.net, None)
+    self.assertEqual(net_conns(closest.net), frozenset(others))
+    for other in others:
+      if other is not closest:
+        self.assertEqual(len(other.cables), 1)
+        cable = other.cables[0]
+        self.assertTrue(closest in [ cable.source, cable.dest ])
+    self.check_nets(area)
+
+def conn_key(conn):
+  return (conn.module.index, conn.direction, conn.index)
+
+def cable_keys(area):
+  return [ (conn_key(c.source), conn_key(c.dest), c.color)
+      for c in area.cables ]
+
+def net_keys(area):
+  return set([ (frozenset(map(conn_key, net_conns(net))),
+      net.output and conn_key(net.output)) for net in area.netlist.nets ])
+
+def find_conn(area, key):
+  module = area.find_module(key[0])
+  return [ module.inputs, module.outputs ][key[1]][key[2]]
+
+class RewireTest(NetTest):
+  def areas(self, seed):
+    '''two equal areas of random cables.'''
+    areas = []
+    for i in xrange(2):
+      area = new_area()
+      random_cables(area, random.Random(seed), 60)
+      areas.append(area)
+    self.assertEqual(cable_keys(areas[0]), cable_keys(areas[1]))
+    return areas
+
+  def test_batch_equals_sequential_disconnects(self):
+    rand = random.Random(3)
+    for round in xrange(10):
+      sequential, batch = self.areas(round)
+      picks = rand.sample(xrange(len(sequential.cables)),
+          len(sequential.cables) / 2)
+      for cable in [ sequential.cables[i] for i in picks ]:
+        sequential.disconnect(cable)
+      rewire = batch.rewire()
+      for cable in [ batch.cables[i] for i in picks ]:
+        rewire.disconnect(cable)
+      rewire.commit()
+      self.assertEqual(cable_keys(batch), cable_keys(sequential))
+      self.assertEqual(net_keys(batch), net_keys(sequential))
+      self.check_nets(batch)
+
+  def test_batch_equals_sequential_removeconnector(self):
+    rand = random.Random(4)
+    for round in xrange(10):
+      sequential, batch = self.areas(round)
+      conns = [ c for m in sequential.modules for c in m.inputs + m.outputs
+          if c.cables ]
+      keys = map(conn_key, rand.sample(conns, len(conns) / 3))
+      for key in keys:
+        sequential.removeconnector(find_conn(sequential, key))
+      rewire = batch.rewire()
+      for key in keys:
+        batch.removeconnector(find_conn(batch, key), rewire)
+      rewire.commit()
+      self.assertEqual(cable_keys(batch), cable_keys(sequential))
+      self.assertEqual(net_keys(batch), net_keys(sequential))
+      self.check_nets(batch)
+
+  def test_netlist_waits_for_commit(self):
+    area = new_area(2)
+    a, b = area.modules
+    area.connect(a.outputs[0], b.inputs[0], 0)
+    cable = area.cables[0]
+    nets = area.netlist.nets
+    rewire = area.rewire()
+    rewire.disconnect(cable)
+    new = rewire.connect(a.outputs[0], b.inputs[1], 0)
+    self.assertEqual(b.inputs[0].cables, [])
+    self.assertEqual(b.inputs[1].cables, [new])
+    self.assertTrue(area.netlist.nets is nets)
+    # a cable connected in the batch can be disconnected in it
+    rewire.disconnect(new)
+    rewire.connect(b.inputs[1], b.inputs[2], 0)
+    rewire.commit()
+    self.assertEqual(cable_keys(area), [ (conn_key(b.inputs[1]),
+        conn_key(b.inputs[2]), 0) ])
+    self.assertEqual(len(area.netlist.nets), 1)
+    self.check_nets(area)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,274 @@
+#
+# test_nm1.py - tests of reading nord modular (nm1) .pch files
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import glob, os, shutil, sys, tempfile, unittest
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+topdir = os.path.dirname(testdir)
+sys.path.insert(0, topdir)
+
+from nord.nm1.file import PchFile, NM1Error, pch_sections
+from nord.nm1.file import field_value, eval_fields, int_rows, int_table
+from nord.nm1.cache import PatchCache, dump_patch, load_patch
+
+pchfiles = sorted(glob.glob(os.path.join(testdir, '*.pch')))
+
+def variants(data):
+  '''variants(data) -> data with CRLF, LF and blank line endings.'''
+  lf = data.replace('\r\n', '\n')
+  return [ data, lf, lf.replace('\n', '\n\n') ]
+
+def find_v3_sections(data):
+  '''the section scan PchFile.readv3 did before pch_sections, one
+data.find() per tag, (tag, stripped non blank lines) in v3tags order.'''
+  sections = []
+  for tag, count in zip(PchFile.v3tags, PchFile.v3counts):
+    off = 0
+    while count > 0:
+      start = data.find('[' + tag + ']', off)
+      if start < 0:
+        break
+      end = data.find('[/' + tag + ']', start)
+      lines = [ l.strip() for l in data[start:end].splitlines() ]
+      sections.append((tag, [ l for l in lines if l ][1:]))
+      off = start + len(tag) + 2
+      count -= 1
+  return sections
+
+def v3_sections(data):
+  '''pch_sections sorted and stripped as PchFile.readv3 does.'''
+  order = dict([ (tag, i) for i, tag in enumerate(PchFile.v3tags) ])
+  sections = [ (order[tag], i, tag, lines) for i, (tag, lines) in
+      enumerate(pch_sections(data, zip(PchFile.v3tags, PchFile.v3counts))) ]
+  sections.sort()
+  return [ (tag, [ l for l in map(str.strip, lines) if l ])
+      for n, i, tag, lines in sections ]
+
+def patch_sig(patch):
+  '''patch_sig(patch) -> comparable summary of a parsed NM1Patch.'''
+  sig = []
+  for area in [ patch.voice, patch.fx ]:
+    sig.append([ (m.index, m.type.shortnm, m.name, m.horiz, m.vert,
+        list(m.values), [ mode.value for mode in m.modes ])
+        for m in area.modules ])
+    sig.append([ (c.color, c.source.module.index, c.source.direction,
+        c.source.index, c.dest.module.index, c.dest.direction, c.dest.index)
+        for c in area.cables ])
+  sig.append([ (k.knob, k.param.index) for k in patch.knobs ])
+  sig.append([ (c.midicc, c.param.index) for c in patch.ctrls ])
+  sig.append([ (m.dial, m.keyassign, [ (x.range, x.param.index)
+      for x in m.maps ]) for m in patch.morphs ])
+  sig.append([ (n.note, n.attack, n.release) for n in patch.notes ])
+  sig.append(patch.textpad)
+  return sig
+
+def read_pch(data, cache=None):
+  '''read_pch(data, cache=None) -> PchFile of .pch file data.'''
+  filename = tempfile.mktemp('.pch')
+  try:
+    open(filename, 'wb').write(data)
+    return PchFile(filename, cache)
+  finally:
+    os.remove(filename)
+
+v2data = '''[Header]\r
+Version=Nord Modular patch 2.10\r
+\r
+[Module 1]\r
+Name=Osc 1\r
+[Modules]\r
+Count=1\r
+[Notes]\r
+some text\r
+'''
+
+def old_findv2defines(data):
+  '''the (title, lines, values) of the V2 defines as findv2defines made
+them before pch_sections.'''
+  data = data.replace('\r','')
+  sections = data.split('\n[')
+  sections = [ ('['+section.strip()).splitlines() for section in sections ]
+  sections[0][0] = sections[0][0][1:] # fix [[Header] to [Header]
+  defines = []
+  for section in sections:
+    title = section[0][1:-1].replace(' ', '')
+    values = [ line.split('=', 1) for line in section[1:] if line.strip() ]
+    defines.append((title, section, [ v for v in values if len(v) > 1 ]))
+  return defines
+
+class SectionsTest(unittest.TestCase):
+  def test_v3_equal_find_scan(self):
+    for filename in pchfiles:
+      for data in variants(open(filename, 'rb').read()):
+        self.assertEqual(v3_sections(data), find_v3_sections(data), filename)
+
+  def test_v3_tag_counts(self):
+    data = open(pchfiles[0], 'rb').read()
+    tags = [ tag for tag, lines in
+        pch_sections(data, zip(PchFile.v3tags, PchFile.v3counts)) ]
+    for tag, count in zip(PchFile.v3tags, PchFile.v3counts):
+      self.assertTrue(tags.count(tag) <= count, tag)
+    self.assertEqual(tags[0], 'Header')
+
+  def test_variants_parse_equal(self):
+    for filename in pchfiles:
+      data = open(filename, 'rb').read()
+      sig = patch_sig(PchFile(filename).patch)
+      self.assertTrue(sig[0])
+      for data in variants(data)[1:]:
+        self.assertEqual(patch_sig(read_pch(data).patch), sig, filename)
+
+  def test_v2(self):
+    for data in variants(v2data):
+      sections = [ (tag, [ l.strip() for l in lines if l.strip() ])
+          for tag, lines in pch_sections(data) ]
+      self.assertEqual(sections, [
+        ('Header', ['Version=Nord Modular patch 2.10']),
+        ('Module 1', ['Name=Osc 1']),
+        ('Modules', ['Count=1']),
+        ('Notes', ['some text']),
+      ])
+
+  def test_v2_defines_equal_old(self):
+    for data in variants(v2data) + [ v2data.replace('\r\n', '\r\r\n'),
+        v2data.replace('some text', 'some\r\n\r\ntext \r\r\n  ') ]:
+      defines = PchFile().findv2defines(data)
+      for title, lines, values in old_findv2defines(data):
+        self.assertEqual(defines[title].lines, lines, repr(data))
+        for name, value in values:
+          self.assertTrue(hasattr(defines[title], name.lower()), name)
+
+def old_eval_fields(s):
+  '''the eval_fields of before field_value.'''
+  try:
+    return [ int(f) for f in s.split() ]
+  except ValueError:
+    return [ eval(f.capitalize()) for f in s.split() ]
+
+def numeric_lines():
+  '''numeric_lines() -> the lines of the test patches eval could read.'''
+  lines = []
+  for filename in pchfiles:
+    for tag, section in v3_sections(open(filename, 'rb').read()):
+      for line in section:
+        try:
+          old_eval_fields(line)
+        except Exception:
+          continue
+        lines.append(line)
+  return lines
+
+class FieldsTest(unittest.TestCase):
+  def test_field_value_equal_eval(self):
+    for field in [ '0', '12', '-3', '+7', '0x1f', '0X1F', 'true', 'false',
+        'True', 'FALSE' ]:
+      self.assertEqual(field_value(field), eval(field.capitalize()), field)
+
+  def test_not_evaluated(self):
+    for field in [ '__import__("os").getcwd()', 'none', 'x', '1.5', '' ]:
+      self.assertRaises(NM1Error, field_value, field)
+    self.assertRaises(NM1Error, eval_fields, '1 2 open("x")')
+
+  def test_lines_equal_eval(self):
+    lines = numeric_lines()
+    self.assertTrue(len(lines) > 100)
+    for line in lines + [ '1 true 0 false', '0x10 -2' ]:
+      self.assertEqual(eval_fields(line), old_eval_fields(line), line)
+
+  def test_int_rows(self):
+    lines = numeric_lines() + [ '', '1 true 0x10' ]
+    values, start = int_rows(lines)
+    self.assertEqual(len(start), len(lines) + 1)
+    for i, line in enumerate(lines):
+      self.assertEqual(list(values[start[i]:start[i+1]]),
+          old_eval_fields(line), line)
+
+  def test_int_table(self):
+    self.assertEqual(list(int_table([ '1 2', '3 true' ], 2, 'test')),
+        [1, 2, 3, 1])
+    self.assertRaises(NM1Error, int_table, [ '1 2', '3' ], 2, 'test')
+    self.assertRaises(NM1Error, int_table, [ '1 2 3', '4' ], 2, 'test')
+
+class PatchCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.dirname = tempfile.mkdtemp()
+    self.cache = PatchCache(os.path.join(self.dirname, 'cache'))
+    self.data = open(pchfiles[0], 'rb').read()
+
+  def tearDown(self):
+    shutil.rmtree(self.dirname)
+
+  def parse(self, data):
+    '''PchFile of data with parsing counted in self.parses.'''
+    test = self
+    class CountedPchFile(PchFile):
+      def readv3(self, data):
+        test.parses += 1
+        PchFile.readv3(self, data)
+    filename = os.path.join(self.dirname, 'test.pch')
+    open(filename, 'wb').write(data)
+    return CountedPchFile(filename, self.cache)
+
+  def test_round_trip(self):
+    for filename in pchfiles:
+      patch = PchFile(filename).patch
+      self.assertEqual(patch_sig(load_patch(dump_patch(patch))),
+          patch_sig(patch), filename)
+
+  def test_hit(self):
+    self.parses = 0
+    sig = patch_sig(self.parse(self.data).patch)
+    self.assertEqual(self.parses, 1)
+    self.assertTrue(os.path.exists(self.cache.path(self.data)))
+    patch = self.parse(self.data).patch
+    self.assertEqual(self.parses, 1)
+    self.assertEqual(patch_sig(patch), sig)
+    self.assertEqual(patch_sig(PchFile(pchfiles[0]).patch), sig)
+
+  def test_invalidate(self):
+    self.parses = 0
+    self.parse(self.data)
+    changed = self.data.replace('\r\n', '\n')
+    self.assertNotEqual(self.cache.key(changed), self.cache.key(self.data))
+    self.parse(changed)
+    self.assertEqual(self.parses, 2)
+    # a new parser (sources or CACHE_FORMAT) gives new keys
+    key = self.cache.key(self.data)
+    self.cache.sources = 'another parser'
+    self.assertNotEqual(self.cache.key(self.data), key)
+    self.parse(self.data)
+    self.assertEqual(self.parses, 3)
+
+  def test_corrupt_entry(self):
+    self.parses = 0
+    sig = patch_sig(self.parse(self.data).patch)
+    path = self.cache.path(self.data)
+    entry = open(path, 'rb').read()
+    for bad in [ 'garbage', entry[:len(entry)/2], '' ]:
+      open(path, 'wb').write(bad)
+      self.assertEqual(self.cache.load(self.data), None)
+      self.assertEqual(patch_sig(self.parse(self.data).patch), sig)
+    # the parse replaced the bad entry
+    self.assertEqual(open(path, 'rb').read(), entry)
+
+if __name__ == '__main__':
+  unittest.main()
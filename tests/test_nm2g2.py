@@ -0,0 +1,150 @@
+#
+# test_nm2g2.py - tests of the nm2g2 command line converter
+#
+# Copyright (c) 2006,2007 Matt Gerassimoff
+#
+# This file is part of g2ools.
+#
+# g2ools is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# g2ools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import os, shutil, subprocess, sys, tempfile, unittest
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+topdir = os.path.dirname(testdir)
+nm2g2 = os.path.join(topdir, 'nm2g2.py')
+sys.path.insert(0, topdir)
+
+from nord.convert import cache
+
+patches = [ 'testfilter.pch', 'testlfo.pch', 'testmixer.pch', 'testosc.pch' ]
+
+def run_nm2g2(dirname, *args):
+  '''run_nm2g2(dirname, args...) - convert the patches in dirname.'''
+  files = [ os.path.join(dirname, name) for name in patches ]
+  return subprocess.check_output([ sys.executable, nm2g2, '-n', '-v', '0' ] +
+      list(args) + files, cwd=dirname, stderr=subprocess.STDOUT)
+
+def read_pch2s(dirname):
+  '''read_pch2s(dirname) -> { name: data } of the .pch2 files of dirname.'''
+  return dict([ (name, open(os.path.join(dirname, name), 'rb').read())
+      for name in os.listdir(dirname) if name.endswith('.pch2') ])
+
+def remove_pch2s(dirname):
+  for name in read_pch2s(dirname):
+    os.remove(os.path.join(dirname, name))
+
+class NM2G2Test(unittest.TestCase):
+  def setUp(self):
+    self.dirname = tempfile.mkdtemp()
+    for name in patches:
+      shutil.copy(os.path.join(testdir, name), self.dirname)
+
+  def tearDown(self):
+    shutil.rmtree(self.dirname)
+
+  def test_jobs_equal_serial(self):
+    run_nm2g2(self.dirname)
+    serial = read_pch2s(self.dirname)
+    self.assertEqual(sorted(serial), sorted([ p + '2' for p in patches ]))
+    remove_pch2s(self.dirname)
+    run_nm2g2(self.dirname, '-j', '3')
+    self.assertEqual(read_pch2s(self.dirname), serial)
+
+  def test_convert_cache(self):
+    cache = os.path.join(self.dirname, 'cache.json')
+    run_nm2g2(self.dirname, '-C', cache)
+    converted = read_pch2s(self.dirname)
+    self.assertTrue(os.path.exists(cache))
+
+    # mark the outputs, a cache hit leaves them alone
+    def mark():
+      for name in converted:
+        open(os.path.join(self.dirname, name), 'wb').write('marker')
+    mark()
+    run_nm2g2(self.dirname, '-C', cache)
+    self.assertEqual(set(read_pch2s(self.dirname).values()), set(['marker']))
+
+    # a changed .pch is converted again, the others are still hits
+    changed = os.path.join(self.dirname, patches[0])
+    open(changed, 'ab').write('\r\n')
+    run_nm2g2(self.dirname, '-C', cache)
+    pch2s = read_pch2s(self.dirname)
+    self.assertEqual(pch2s[patches[0] + '2'], converted[patches[0] + '2'])
+    for name in patches[1:]:
+      self.assertEqual(pch2s[name + '2'], 'marker')
+
+    # an option changing the output invalidates every entry
+    mark()
+    run_nm2g2(self.dirname, '-C', cache, '-p')
+    self.assertFalse('marker' in read_pch2s(self.dirname).values())
+
+    # so does a missing .pch2
+    mark()
+    os.remove(os.path.join(self.dirname, patches[1] + '2'))
+    run_nm2g2(self.dirname, '-C', cache, '-p')
+    pch2s = read_pch2s(self.dirname)
+    self.assertNotEqual(pch2s[patches[1] + '2'], 'marker')
+    self.assertEqual(pch2s[patches[2] + '2'], 'marker')
+
+class Options(object):
+  programpath = nm2g2
+  pchcache = None
+  def __getattr__(self, name):
+    return False
+
+class ConvertCacheKeyTest(unittest.TestCase):
+  def setUp(self):
+    self.hashes = cache.source_hashes.copy()
+    self.filename = os.path.join(testdir, patches[0])
+    self.convert_cache = cache.ConvertCache(tempfile.mktemp('.json'))
+
+  def tearDown(self):
+    cache.source_hashes.clear()
+    cache.source_hashes.update(self.hashes)
+
+  def key(self, options=Options()):
+    return self.convert_cache.key(self.filename, options, [])
+
+  def test_output_modules_in_key(self):
+    key = self.key()
+    for name in [ 'nord.g2.bits', 'nord.g2.crc', 'nord.graph',
+        'nord.g2.file', 'nord.g2.misc' ]:
+      cache.source_hash(name)
+      cache.source_hashes[name] = 'changed'
+      self.assertNotEqual(self.key(), key, name)
+      del cache.source_hashes[name]
+      self.assertEqual(self.key(), key, name)
+
+  def test_compiled_bits_in_key(self):
+    try:
+      import nord.g2._bits
+    except ImportError:
+      return
+    key = self.key()
+    cache.source_hashes['nord.g2._bits'] = 'changed'
+    self.assertNotEqual(self.key(), key)
+
+  def test_pch_cache_in_key(self):
+    options = Options()
+    options.pchcache = 'cachedir'
+    key = self.key(options)
+    self.assertNotEqual(key, self.key())
+    cache.source_hash('nord.nm1.cache')
+    cache.source_hashes['nord.nm1.cache'] = 'changed'
+    self.assertNotEqual(self.key(options), key)
+
+if __name__ == '__main__':
+  unittest.main()